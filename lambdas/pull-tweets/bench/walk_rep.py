@@ -0,0 +1,66 @@
+"""
+Compares single-pass utils.walk_rep with the helpers it replaced in API._gql_items
+(get_by_path for entries, find_obj for cursor, get_typed_object for to_old_rep).
+
+Usage (from lambdas/pull-tweets):
+    python bench/walk_rep.py [page.json ...]
+
+Without arguments fixtures/user_tweets_page.json is used (UserTweets page in x.com's shape:
+20 tweets, 5 quoted, 4 with visibility results). Recorded pages can be saved from
+`API(debug=True)` dumps (json body only) and passed as arguments.
+"""
+
+import json
+import os
+import sys
+import timeit
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from libs.twscrape.utils import find_obj, get_by_path, get_typed_object, walk_rep  # noqa: E402
+
+DEFAULT_PAGE = os.path.join(os.path.dirname(__file__), "fixtures", "user_tweets_page.json")
+
+
+def old_walk(obj: dict):
+    entries = get_by_path(obj, "entries")
+    cursor = find_obj(obj, lambda x: x.get("cursorType") == "Bottom")
+    typed = get_typed_object(obj, defaultdict(list))
+    return entries, cursor.get("value") if cursor else None, typed
+
+
+def new_walk(obj: dict):
+    res = walk_rep(obj)
+    return res.entries, res.cursors.get("Bottom"), res.typed
+
+
+def same(a, b) -> bool:
+    # same objects found (by identity), in same order
+    ids = lambda typed: {k: [id(x) for x in v] for k, v in typed.items()}  # noqa: E731
+    return a[0] is b[0] and a[1] == b[1] and ids(a[2]) == ids(b[2])
+
+
+def bench(path: str, number=1000, repeat=7):
+    with open(path, "rb") as f:
+        obj = json.loads(f.read())
+
+    if not same(old_walk(obj), new_walk(obj)):
+        print(f"{path}: results differ")
+        return
+
+    # min of repeats, least affected by other load on machine
+    t_old = min(timeit.repeat(lambda: old_walk(obj), number=number, repeat=repeat)) / number
+    t_new = min(timeit.repeat(lambda: new_walk(obj), number=number, repeat=repeat)) / number
+    typed = sum(len(x) for x in walk_rep(obj).typed.values())
+
+    print(f"{os.path.basename(path)} ({typed} typed objects)")
+    print(f"  get_by_path + find_obj + get_typed_object: {t_old * 1e6:8.1f} us/page")
+    print(f"  walk_rep:                                  {t_new * 1e6:8.1f} us/page")
+    print(f"  {t_old / t_new:.2f}x")
+
+
+if __name__ == "__main__":
+    print(f"python {sys.version.split()[0]}")
+    for path in sys.argv[1:] or [DEFAULT_PAGE]:
+        bench(path)
@@ -4,4 +4,8 @@ from .accounts_pool import AccountsPool, NoAccountError
 from .api import API
 from .logger import set_log_level
 from .models import *  # noqa: F403
+from .serializer import to_dict
+from .storage import AccountsStorage, MemoryStorage, SqliteStorage
+from .strategies import SelectionStrategy
+from .transport import close_transports
 from .utils import gather
@@ -4,9 +4,10 @@ import sqlite3
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
 
-from httpx import AsyncClient, AsyncHTTPTransport
+from httpx import AsyncClient
 
 from .models import JSONTrait
+from .transport import shared_transport
 from .utils import utc
 
 TOKEN = "Bearer AAAAAAAAAAAAAAAAAAAAANRILgAAAAAAnNwIzUejRCOuH5E6I8xnZz4puTs%3D1Zv7ttfk8LF81IUq16cHjhLTvJu4FA33AGWWjCpTnA"
@@ -35,6 +36,13 @@ class Account(JSONTrait):
         doc = dict(rs)
         doc["locks"] = {k: utc.from_iso(v) for k, v in json.loads(doc["locks"]).items()}
         doc["stats"] = {k: v for k, v in json.loads(doc["stats"]).items() if isinstance(v, int)}
+
+        # since v5 locks & stats stored in own tables (see ACCOUNT_COLS in queries.py)
+        if "queue_locks" in doc:
+            doc["locks"] = {k: utc.from_ts(int(v)) for k, v in _split_kv(doc.pop("queue_locks"))}
+        if "queue_stats" in doc:
+            doc["stats"] = {k: int(v) for k, v in _split_kv(doc.pop("queue_stats"))}
+
         doc["headers"] = json.loads(doc["headers"])
         doc["cookies"] = json.loads(doc["cookies"])
         doc["active"] = bool(doc["active"])
@@ -55,8 +63,8 @@ class Account(JSONTrait):
         proxies = [x for x in proxies if x is not None]
         proxy = proxies[0] if proxies else None
 
-        transport = AsyncHTTPTransport(retries=2)
-        client = AsyncClient(proxy=proxy, follow_redirects=True, transport=transport)
+        # connections pooled per proxy across accounts, see transport.py
+        client = AsyncClient(follow_redirects=True, transport=shared_transport(proxy))
 
         # saved from previous usage
         client.cookies.update(self.cookies)
@@ -73,3 +81,8 @@ class Account(JSONTrait):
             client.headers["x-csrf-token"] = client.cookies["ct0"]
 
         return client
+
+
+def _split_kv(val: str | None):
+    # "queue1:value1,queue2:value2" as returned by group_concat
+    return [x.rsplit(":", 1) for x in val.split(",")] if val else []
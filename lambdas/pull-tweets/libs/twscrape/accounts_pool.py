@@ -1,18 +1,26 @@
 import asyncio
-import sqlite3
+import contextlib
+import itertools
+import os
+import socket
 import uuid
-from datetime import datetime, timezone, timedelta
+from collections import deque
+from datetime import datetime, timezone
 from typing import TypedDict
-import json
 
-from fake_useragent import UserAgent
 from httpx import HTTPStatusError
 
 from .account import Account
-from .db import execute, fetchall, fetchone, log_and_sanitize_query
+from .health import HealthTracker
 from .logger import logger
 from .login import LoginConfig, login
+from .queries import IN_CHUNK_SIZE
+from .rate_limits import RateBudget, RateLimits
+from .storage import AccountsStorage, get_storage
+from .strategies import SelectionStrategy, get_strategy
+from .user_agents import get_user_agent
 from .utils import get_env_bool, parse_cookies, utc
+from .write_buffer import WriteBuffer
 
 
 class NoAccountError(Exception):
@@ -33,19 +41,129 @@ def guess_delim(line: str):
     return rp[0] if not lp else lp[-1]
 
 
+def make_account(
+    username: str,
+    password: str,
+    email: str,
+    email_password: str,
+    user_agent: str,
+    proxy: str | None = None,
+    cookies: str | None = None,
+    mfa_code: str | None = None,
+):
+    if not username or not password or not email or not email_password:
+        raise ValueError(f"Missing required account fields for '{username}'")
+
+    account = Account(
+        username=username,
+        password=password,
+        email=email,
+        email_password=email_password,
+        user_agent=user_agent,
+        active=False,
+        locks={},
+        stats={},
+        headers={},
+        cookies=parse_cookies(cookies) if cookies else {},
+        proxy=proxy,
+        mfa_code=mfa_code,
+    )
+
+    if "ct0" in account.cookies:
+        account.active = True
+
+    return account
+
+
 class AccountsPool:
-    # _order_by: str = "RANDOM()"
-    _order_by: str = "username"
+    _wait_poll: float = 5.0  # seconds, re-check db for accounts released by other processes
 
     def __init__(
         self,
         db_file="accounts.db",
         login_config: LoginConfig | None = None,
         raise_when_no_account=False,
+        strategy: str | SelectionStrategy = "username",
+        rate_limit_reserve: int = 1,
+        write_behind_ms: int | None = None,
+        storage: str | AccountsStorage = "sqlite",
+        lease_ttl: int = 120,
     ):
+        # storage "sqlite" works directly with db_file, "memory" loads accounts from it once
+        # and writes back only on checkpoint (see storage.py); `strategy` picks free account
+        # for queue, "username" (alphabetical, as before) by default (see strategies.py)
         self._db_file = db_file
+        self._storage = get_storage(storage, db_file)
         self._login_config = login_config or LoginConfig()
         self._raise_when_no_account = raise_when_no_account
+        self._strategy = get_strategy(strategy)
+        self.rate_limits = RateLimits(reserve=rate_limit_reserve)
+        self.health = HealthTracker()
+        self._waiters: dict[str, deque[asyncio.Future]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+
+        # with `write_behind_ms` lock / unlock / usage updates kept in memory and written in one
+        # transaction every N ms (and on close), so db writes don't grow with requests count;
+        # until flushed released accounts still locked in db (for this and other processes)
+        self._write_behind = write_behind_ms / 1000 if write_behind_ms else None
+        self._buffer = WriteBuffer()
+        self._flush_task: asyncio.Task | None = None
+        self._flushing: WriteBuffer | None = None
+
+        # claimed account is leased for `lease_ttl` seconds and lease renewed by QueueClient
+        # heartbeat while in use, so accounts of crashed / timed out workers free up quickly;
+        # each claim has own owner id (kept by claimer, see lease_owner), so expired lease
+        # taken by other worker (or other client of this pool) is not released
+        self.lease_ttl = lease_ttl
+        self._owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lease_seq = itertools.count(1)
+        self._flush_lock: tuple[asyncio.AbstractEventLoop, asyncio.Lock] | None = None
+
+    async def close(self):
+        await self.flush()
+        await self._storage.close()
+
+    async def flush(self):
+        # scheduled flush not needed anymore (task is set only while it waits to start)
+        task, self._flush_task = self._flush_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+        loop = asyncio.get_running_loop()
+        if self._flush_lock is None or self._flush_lock[0] is not loop:
+            self._flush_lock = (loop, asyncio.Lock())
+
+        # lock keeps flushes in order, so older lock state can't overwrite newer one
+        async with self._flush_lock[1]:
+            if not self._buffer:
+                return
+
+            taken = self._flushing = self._buffer.take()
+            try:
+                await self._storage.apply(taken)
+            except BaseException:
+                self._buffer.merge_back(taken)
+                raise
+            finally:
+                self._flushing = None
+
+    def _schedule_flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+
+        async def flush_later():
+            await asyncio.sleep(self._write_behind or 0)
+            self._flush_task = None
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush accounts updates: {e}")
+
+        self._flush_task = asyncio.create_task(flush_later())
+
+    async def checkpoint(self):
+        await self.flush()
+        await self._storage.checkpoint()
 
     async def load_from_file(self, filepath: str, line_format: str):
         line_delim = guess_delim(line_format)
@@ -55,22 +173,29 @@ class AccountsPool:
         if not required.issubset(tokens):
             raise ValueError(f"Invalid line format: {line_format}")
 
-        accounts = []
+        # whole file validated first, then all accounts inserted in one transaction
+        accounts: list[Account] = []
         with open(filepath, "r") as f:
-            lines = f.read().split("\n")
-            lines = [x.strip() for x in lines if x.strip()]
+            for idx, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
 
-            for line in lines:
                 data = [x.strip() for x in line.split(line_delim)]
                 if len(data) < len(tokens):
-                    raise ValueError(f"Invalid line: {line}")
+                    raise ValueError(f"Invalid line {idx}: {line}")
 
                 data = data[: len(tokens)]
                 vals = {k: v for k, v in zip(tokens, data) if k != "_"}
-                accounts.append(vals)
+                if not vals.get("user_agent"):
+                    vals["user_agent"] = get_user_agent(vals.get("username"))
 
-        for x in accounts:
-            await self.add_account(**x)
+                try:
+                    accounts.append(make_account(**vals))
+                except ValueError as e:
+                    raise ValueError(f"Invalid line {idx}: {e}") from e
+
+        return await self.add_accounts(accounts)
 
     async def add_account(
         self,
@@ -83,33 +208,49 @@ class AccountsPool:
         cookies: str | None = None,
         mfa_code: str | None = None,
     ):
-        qs = "SELECT * FROM accounts WHERE username = :username"
-        rs = await fetchone(self._db_file, qs, {"username": username})
-        if rs:
+        if await self._storage.get(username):
             logger.warning(f"Account {username} already exists")
             return
 
-        account = Account(
+        account = make_account(
             username=username,
             password=password,
             email=email,
             email_password=email_password,
-            user_agent=user_agent or UserAgent().safari,
-            active=False,
-            locks={},
-            stats={},
-            headers={},
-            cookies=parse_cookies(cookies) if cookies else {},
+            user_agent=user_agent or get_user_agent(username),
             proxy=proxy,
+            cookies=cookies,
             mfa_code=mfa_code,
         )
 
-        if "ct0" in account.cookies:
-            account.active = True
-
         await self.save(account)
         logger.info(f"Account {username} added successfully (active={account.active})")
 
+    async def add_accounts(self, accounts: list[Account]):
+        # bulk insert, accounts which already exist (in db or earlier in list) are skipped
+        rows, seen, skipped = [], set(), []
+        for x in accounts:
+            key = x.username.lower()  # username is COLLATE NOCASE
+            if key in seen:
+                skipped.append(x.username)
+                continue
+
+            seen.add(key)
+            rows.append(x)
+
+        if not rows:
+            return {"total": len(accounts), "added": 0, "skipped": skipped}
+
+        rows, exists = await self._storage.add_new(rows)
+        skipped.extend(exists)
+
+        for x in skipped:
+            logger.warning(f"Account {x} already exists")
+
+        msg = f"Added {len(rows)} accounts, {len(skipped)} skipped as duplicates"
+        logger.info(f"{msg} (active={sum(1 for x in rows if x.active)})")
+        return {"total": len(accounts), "added": len(rows), "skipped": skipped}
+
     async def delete_accounts(self, usernames: str | list[str]):
         usernames = usernames if isinstance(usernames, list) else [usernames]
         usernames = list(set(usernames))
@@ -117,45 +258,26 @@ class AccountsPool:
             logger.warning("No usernames provided")
             return
 
-        qs = f"""DELETE FROM accounts WHERE username IN ({','.join([f'"{x}"' for x in usernames])})"""
-        await execute(self._db_file, qs)
+        await self._storage.delete(usernames)
 
     async def delete_inactive(self):
-        qs = "DELETE FROM accounts WHERE active = false"
-        qs = log_and_sanitize_query(qs)
-        await execute(self._db_file, qs)
+        await self._storage.delete_inactive()
 
     async def get(self, username: str):
-        qs = "SELECT * FROM accounts WHERE username = :username"
-        rs = await fetchone(self._db_file, qs, {"username": username})
-        if not rs:
+        account = await self._storage.get(username)
+        if not account:
             raise ValueError(f"Account {username} not found")
-        return Account.from_rs(rs)
+        return account
 
     async def get_all(self):
-        qs = "SELECT * FROM accounts"
-        rs = await fetchall(self._db_file, qs)
-        return [Account.from_rs(x) for x in rs]
+        await self.flush()
+        return await self._storage.get_all()
 
     async def get_account(self, username: str):
-        qs = "SELECT * FROM accounts WHERE username = :username"
-        print(f"[DEBUG] Database file path: {self._db_file}")
-
-        rs = await fetchone(self._db_file, qs, {"username": username})
-        if not rs:
-            return None
-        return Account.from_rs(rs)
+        return await self._storage.get(username)
 
     async def save(self, account: Account):
-        data = account.to_rs()
-        cols = list(data.keys())
-
-        qs = f"""
-        INSERT INTO accounts ({",".join(cols)}) VALUES ({",".join([f":{x}" for x in cols])})
-        ON CONFLICT(username) DO UPDATE SET {",".join([f"{x}=excluded.{x}" for x in cols])}
-        """
-        qs = log_and_sanitize_query(qs)
-        await execute(self._db_file, qs, data)
+        await self._storage.save(account)
 
     async def login(self, account: Account):
         try:
@@ -172,339 +294,298 @@ class AccountsPool:
         finally:
             await self.save(account)
 
-    async def login_all(self, usernames: list[str] | None = None):
+    async def login_all(
+        self,
+        usernames: list[str] | None = None,
+        concurrency: int = 1,
+        per_proxy: int | None = None,
+    ):
         if usernames is None:
-            qs = "SELECT * FROM accounts WHERE active = false AND error_msg IS NULL"
+            accounts = await self._storage.get_not_logged_in()
         else:
-            us = ",".join([f'"{x}"' for x in usernames])
-            qs = f"SELECT * FROM accounts WHERE username IN ({us})"
-            
-        qs = log_and_sanitize_query(qs)
-        rs = await fetchall(self._db_file, qs)
-        accounts = [Account.from_rs(rs) for rs in rs]
-        # await asyncio.gather(*[login(x) for x in self.accounts])
+            accounts = await self._storage.get_many(list(usernames))
 
+        if self._login_config.manual:
+            concurrency = 1  # email codes entered one by one
+
+        # limit parallel logins in total and per outgoing ip (proxy), each result saved
+        # by self.login as soon as it ready, so interrupted run keeps what already done
+        total_sem = asyncio.Semaphore(max(concurrency, 1))
+        proxy_sems: dict[str | None, asyncio.Semaphore] = {}
         counter = {"total": len(accounts), "success": 0, "failed": 0}
-        for i, x in enumerate(accounts, start=1):
-            logger.info(f"[{i}/{len(accounts)}] Logging in {x.username} - {x.email}")
-            status = await self.login(x)
+
+        async def login_one(x: Account):
+            proxy = os.getenv("TWS_PROXY") or x.proxy  # same order as in Account.make_client
+            if per_proxy is not None and proxy not in proxy_sems:
+                proxy_sems[proxy] = asyncio.Semaphore(max(per_proxy, 1))
+            proxy_sem = proxy_sems.get(proxy) or contextlib.nullcontext()
+
+            async with proxy_sem, total_sem:
+                logger.info(f"Logging in {x.username} - {x.email}")
+                status = await self.login(x)
+
             counter["success" if status else "failed"] += 1
+            done = counter["success"] + counter["failed"]
+            msg = f"success: {counter['success']}, failed: {counter['failed']}"
+            logger.info(f"[{done}/{counter['total']}] Login {x.username} done ({msg})")
+
+        await asyncio.gather(*[login_one(x) for x in accounts])
         return counter
 
-    async def relogin(self, usernames: str | list[str]):
+    async def relogin(
+        self, usernames: str | list[str], concurrency=1, per_proxy: int | None = None
+    ):
         usernames = usernames if isinstance(usernames, list) else [usernames]
         usernames = list(set(usernames))
         if not usernames:
             logger.warning("No usernames provided")
             return
 
-        # Prepare the SQL query with placeholders
-        qs = f"""
-        UPDATE accounts SET
-            active = false,
-            locks = :locks,
-            last_used = NULL,
-            error_msg = NULL,
-            headers = :headers,
-            cookies = :cookies,
-            user_agent = :user_agent
-        WHERE username IN ({','.join([f"'{x}'" for x in usernames])})
-        """
-        qs = log_and_sanitize_query(qs)
-        # Prepare the parameters
-        params = {
-            "locks": '{}',
-            "headers": '{}',
-            "cookies": '{}',
-            "user_agent": UserAgent().safari
-        }
-
-        await execute(self._db_file, qs, params)
-        await self.login_all(usernames)
-
-    async def relogin_failed(self):
-        qs = "SELECT username FROM accounts WHERE active = false AND error_msg IS NOT NULL"
-        qs = log_and_sanitize_query(qs)
-        rs = await fetchall(self._db_file, qs)
-        await self.relogin([x["username"] for x in rs])
+        await self._storage.reset_for_relogin({x: get_user_agent(x) for x in usernames})
+        await self.login_all(usernames, concurrency=concurrency, per_proxy=per_proxy)
+
+    async def relogin_failed(self, concurrency=1, per_proxy: int | None = None):
+        usernames = await self._storage.failed_usernames()
+        await self.relogin(usernames, concurrency=concurrency, per_proxy=per_proxy)
 
     async def reset_locks(self):
-        qs = "UPDATE accounts SET locks = :locks"
-        params = {"locks": '{}'}
-        qs = log_and_sanitize_query(qs)
-        
-        await execute(self._db_file, qs, params)
+        self._buffer.drop_locks()
+        await self._storage.reset_locks()
+        for queue in list(self._waiters.keys()):
+            self._notify_release(queue)
 
     async def set_active(self, username: str, active: bool):
-        qs = "UPDATE accounts SET active = :active WHERE username = :username"
-        qs = log_and_sanitize_query(qs)
-        
-        await execute(self._db_file, qs, {"username": username, "active": active})
+        await self._storage.set_active(username, active)
 
     async def lock_until(self, username: str, queue: str, unlock_at: int, req_count=0):
-        # Fetch current locks and stats
-        qs = "SELECT locks, stats FROM accounts WHERE username = :username"
-        qs = log_and_sanitize_query(qs)
-        
-        rs = await fetchone(self._db_file, qs, {"username": username})
-        if not rs:
-            raise ValueError(f"Account {username} not found")
-        locks_json, stats_json = rs["locks"], rs["stats"]
-
-        # Deserialize JSON strings
-        locks = json.loads(locks_json) if locks_json else {}
-        stats = json.loads(stats_json) if stats_json else {}
-
-        # Update locks and stats
-        unlock_time = datetime.utcfromtimestamp(unlock_at).isoformat()
-        locks[queue] = unlock_time
-        stats[queue] = stats.get(queue, 0) + req_count
-
-        # Update last_used
-        last_used_time = datetime.utcfromtimestamp(utc.ts()).isoformat()
-
-        # Serialize back to JSON
-        locks_str = json.dumps(locks)
-        stats_str = json.dumps(stats)
-
-        # Update the database
-        qs = """
-        UPDATE accounts SET
-            locks = :locks,
-            stats = :stats,
-            last_used = :last_used
-        WHERE username = :username
-        """
-        qs = log_and_sanitize_query(qs)
-        
-        params = {
-            "locks": locks_str,
-            "stats": stats_str,
-            "last_used": last_used_time,
-            "username": username
-        }
-        await execute(self._db_file, qs, params)
-
-    async def unlock(self, username: str, queue: str, req_count=0):
-        # Fetch current locks and stats
-        qs = "SELECT locks, stats FROM accounts WHERE username = :username"
-        qs = log_and_sanitize_query(qs)
-        
-        rs = await fetchone(self._db_file, qs, {"username": username})
-        if not rs:
-            raise ValueError(f"Account {username} not found")
-        locks_json, stats_json = rs["locks"], rs["stats"]
-
-        # Deserialize JSON strings
-        locks = json.loads(locks_json) if locks_json else {}
-        stats = json.loads(stats_json) if stats_json else {}
-
-        # Update locks and stats
-        locks.pop(queue, None)
-        stats[queue] = stats.get(queue, 0) + req_count
-
-        # Update last_used
-        last_used_time = datetime.utcfromtimestamp(utc.ts()).isoformat()
-
-        # Serialize back to JSON
-        locks_str = json.dumps(locks)
-        stats_str = json.dumps(stats)
-
-        # Update the database
-        qs = """
-        UPDATE accounts SET
-            locks = :locks,
-            stats = :stats,
-            last_used = :last_used
-        WHERE username = :username
-        """
-        qs = log_and_sanitize_query(qs)
-        
-        params = {
-            "locks": locks_str,
-            "stats": stats_str,
-            "last_used": last_used_time,
-            "username": username
-        }
-        await execute(self._db_file, qs, params)
-
-    async def _get_and_lock(self, queue: str, condition: str):
-        # if space in condition, it's a subquery, otherwise it's username
-        condition_str = f"({condition})" if " " in condition else f"'{condition}'"
-
-        # Fetch the account(s) matching the condition
-        qs = f"SELECT * FROM accounts WHERE username = {condition_str}"
-        qs = log_and_sanitize_query(qs)
-        
-        rs = await fetchone(self._db_file, qs)
-        if not rs:
-            return None
-        account = Account.from_rs(rs)
-
-        # Update locks and last_used
-        locks = json.loads(account.locks) if account.locks else {}
-        # Set lock for queue to current time + 15 minutes
-        unlock_time = (datetime.utcnow() + timedelta(minutes=15)).isoformat()
-        locks[queue] = unlock_time
-
-        # Update last_used
-        last_used_time = datetime.utcfromtimestamp(utc.ts()).isoformat()
-
-        # Serialize locks back to JSON
-        locks_str = json.dumps(locks)
-
-        # Update the account in the database
-        qs = """
-        UPDATE accounts SET
-            locks = :locks,
-            last_used = :last_used
-        WHERE username = :username
-        """
-        qs = log_and_sanitize_query(qs)
-        
-        params = {
-            "locks": locks_str,
-            "last_used": last_used_time,
-            "username": account.username
-        }
-        await execute(self._db_file, qs, params)
-
-        # Update the account object
-        account.locks = locks_str
-        account.last_used = last_used_time
+        # account rate limited for whoever holds it, so locked even if lease was lost
+        self.health.released(username)
+        if self._write_behind is not None:
+            self._buffer.set_lock(username, queue, unlock_at, req_count)
+            self._schedule_flush()
+        else:
+            await self._storage.update_usage(username, queue, req_count, unlock_at)
+
+        self._schedule_release(queue, unlock_at)
+
+    async def unlock(self, username: str, queue: str, req_count=0, owner: str | None = None):
+        # with `owner` only that lease released, without – any lock of account on queue
+        self.health.released(username)
+        if self._write_behind is not None:
+            self._buffer.set_lock(username, queue, None, req_count, owner=owner)
+            self._schedule_flush()
+        else:
+            await self._storage.update_usage(username, queue, req_count, None, owner=owner)
+
+        self._notify_release(queue)
+
+    async def _get_and_lock(
+        self,
+        queue: str,
+        username: str | None = None,
+        skip: list[str] | None = None,
+        demote: list[str] | None = None,
+    ):
+        # leased for queue, released in QueueClient._close_ctx
+        until = utc.ts() + self.lease_ttl
+        owner = f"{self._owner_id}:{next(self._lease_seq)}"
+        account = await self._storage.claim(
+            queue, self._strategy, until, owner, username, skip=skip, demote=demote
+        )
+        if account is not None:
+            self._buffer.claimed(account.username, queue)
+            setattr(account, "__lease", owner)
         return account
 
+    @staticmethod
+    def lease_owner(account: Account) -> str | None:
+        # owner id of claim which returned `account` (None if not claimed by get_for_queue)
+        return getattr(account, "__lease", None)
+
+    async def renew_lease(self, username: str, queue: str, owner: str | None) -> bool:
+        if owner is None:
+            return False
+
+        until = utc.ts() + self.lease_ttl
+        if await self._storage.renew(username, queue, owner, until):
+            return True
+
+        logger.warning(f"Lease of {username} on {queue} lost (expired and taken by other worker)")
+        return False
+
     async def get_for_queue(self, queue: str):
-        # Fetch active accounts
-        qs = f"SELECT * FROM accounts WHERE active = true ORDER BY {self._order_by}"
-        qs = log_and_sanitize_query(qs)
-        
-        rs_list = await fetchall(self._db_file, qs)
-        for rs in rs_list:
-            account = Account.from_rs(rs)
-            # Check locks
-            locks = json.loads(account.locks) if account.locks else {}
-            lock_time_str = locks.get(queue)
-            if lock_time_str:
-                lock_time = datetime.fromisoformat(lock_time_str)
-                now = datetime.utcnow()
-                if lock_time > now:
-                    # Account is locked for this queue
-                    continue
-            # Account is available
-            return await self._get_and_lock(queue, account.username)
-        # No available account found
+        account = await self._get_for_queue(queue)
+        flushing = self._flushing is not None and self._flushing.has_release(queue)
+        if account is None and (flushing or self._buffer.has_release(queue)):
+            # released accounts still locked in db until flush, so flush now and retry
+            await self.flush()
+            account = await self._get_for_queue(queue)
+        return account
+
+    async def _get_for_queue(self, queue: str):
+        # claim goes by strategy in single query if possible; unhealthy accounts skipped or
+        # demoted in same query, candidates ranked in python only when account can be probed
+        unhealthy = self.health.has_unhealthy()
+        if self._strategy.in_sql and not unhealthy:
+            return await self._get_and_lock(queue)
+
+        skip, demote = self.health.skipped(), self.health.degraded()
+        fits = len(skip) + len(demote) <= IN_CHUNK_SIZE
+        if self._strategy.in_sql and fits and not self.health.probe_ready():
+            return await self._get_and_lock(queue, skip=skip, demote=demote)
+
+        rs = await self._storage.candidates(queue, self._strategy)
+        usernames = self._strategy.choose(self, queue, rs)
+        if unhealthy:
+            usernames = [x for x in usernames if self.health.allows(x)]
+            usernames = sorted(usernames, key=self.health.rank)  # stable for strategy order
+
+        for username in usernames:
+            # account can be taken by other worker between select and lock, so try next one
+            if account := await self._get_and_lock(queue, username):
+                self.health.claimed(account.username)
+                return account
+
         return None
 
+    def report_outcome(self, username: str, ok: bool):
+        # called by QueueClient with result of each request (see HealthTracker)
+        self.health.report(username, ok)
+
+    def update_rate_limit(
+        self, username: str, queue: str, remaining: int, reset_at: int, limit: int = -1
+    ):
+        # called on every api response with x-rate-limit-* headers
+        self.rate_limits.update(username, queue, remaining, reset_at, limit)
+
+    def get_rate_limit(self, username: str, queue: str) -> RateBudget | None:
+        return self.rate_limits.get(username, queue)
+
+    async def capacity(self, queue: str):
+        # predicted requests available for queue now (by last known rate limits of accounts)
+        usernames = await self._storage.active_usernames()
+        return self.rate_limits.capacity(queue, usernames)
+
     async def get_for_queue_or_wait(self, queue: str) -> Account | None:
-        msg_shown = False
+        msg_shown, woken = False, False
         while True:
             account = await self.get_for_queue(queue)
             if not account:
                 if self._raise_when_no_account or get_env_bool("TWS_RAISE_WHEN_NO_ACCOUNT"):
                     raise NoAccountError(f"No account available for queue {queue}")
 
+                rep = (await self.queue_stats(queue))["queues"].get(queue)
+                unlock_at = rep["next_unlock"] if rep else None
                 if not msg_shown:
-                    nat = await self.next_available_at(queue)
-                    if not nat:
+                    if rep is None:
                         logger.warning("No active accounts. Stopping...")
                         return None
 
+                    nat = self._format_unlock_ts(unlock_at) if unlock_at else "now"
                     msg = f'No account available for queue "{queue}". Next available at {nat}'
                     logger.info(msg)
                     msg_shown = True
 
-                await asyncio.sleep(5)
+                # who was woken already waited longer than new waiters, so keep it first in line
+                woken = await self._wait_for_release(queue, unlock_at, first=woken)
                 continue
             else:
                 if msg_shown:
                     logger.info(f"Continuing with account {account.username} on queue {queue}")
 
+            if woken:
+                # few accounts can be released at once, let next waiter to check
+                self._notify_release(queue)
+
             return account
 
+    async def _wait_for_release(self, queue: str, unlock_at: int | None, first=False) -> bool:
+        # waiters parked in FIFO order and woken by unlock / lock_until or when earliest lock
+        # for queue expires; timeout is fallback for accounts released by other processes
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        waiters = self._waiters.setdefault(queue, deque())
+        waiters.appendleft(fut) if first else waiters.append(fut)
+        if unlock_at is not None:
+            self._schedule_release(queue, unlock_at)
+
+        try:
+            await asyncio.wait_for(fut, self._wait_poll)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if fut in waiters:
+                waiters.remove(fut)
+
+    def _notify_release(self, queue: str):
+        waiters = self._waiters.get(queue)
+        while waiters:
+            fut = waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+
+    def _schedule_release(self, queue: str, unlock_at: int):
+        if not self._waiters.get(queue):
+            return
+
+        delay = unlock_at - utc.now().timestamp()
+        if delay <= 0:
+            return  # already expired, but not acquired – fallback polling will handle it
+
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+
+        timer = self._timers.get(queue)
+        if timer is not None and not timer.cancelled() and timer.when() <= when:
+            return
+
+        if timer is not None:
+            timer.cancel()
+
+        def on_expire():
+            self._timers.pop(queue, None)
+            self._notify_release(queue)
+
+        self._timers[queue] = loop.call_at(when, on_expire)
+
+    def _format_unlock_ts(self, unlock_at: int):
+        earliest_lock_time = utc.from_ts(unlock_at)
+        now = utc.now()
+        if earliest_lock_time < now:
+            return "now"
+        at_local = datetime.now() + (earliest_lock_time - now)
+        return at_local.strftime("%H:%M:%S")
+
     async def next_available_at(self, queue: str):
-        # Fetch all active accounts
-        qs = "SELECT locks FROM accounts WHERE active = true"
-        qs = log_and_sanitize_query(qs)
-        
-        rs_list = await fetchall(self._db_file, qs)
-        earliest_lock_time = None
-        for rs in rs_list:
-            locks_json = rs["locks"]
-            locks = json.loads(locks_json) if locks_json else {}
-            lock_time_str = locks.get(queue)
-            if lock_time_str:
-                lock_time = datetime.fromisoformat(lock_time_str)
-                if earliest_lock_time is None or lock_time < earliest_lock_time:
-                    earliest_lock_time = lock_time
-        if earliest_lock_time:
-            now = datetime.utcnow()
-            if earliest_lock_time < now:
-                return "now"
-            at_local = datetime.now() + (earliest_lock_time - now)
-            return at_local.strftime("%H:%M:%S")
-        return None
+        rep = (await self.queue_stats(queue))["queues"].get(queue)
+        if rep is None or rep["available"] > 0:
+            return "now" if rep is not None else None
+        return self._format_unlock_ts(rep["next_unlock"])
 
     async def mark_inactive(self, username: str, error_msg: str | None):
-        qs = """
-        UPDATE accounts SET active = false, error_msg = :error_msg
-        WHERE username = :username
-        """
-        qs = log_and_sanitize_query(qs)
-        
-        await execute(self._db_file, qs, {"username": username, "error_msg": error_msg})
+        await self._storage.mark_inactive(username, error_msg)
+
+    async def queue_stats(self, queue: str | None = None):
+        await self.flush()
+        # totals and per-queue locked / available counts with earliest unlock (queues without
+        # locks of active accounts are not listed)
+        rep = await self._storage.queue_stats(queue)
+        total, active, queues = rep["total"], rep["active"], rep["queues"]
+        for v in queues.values():
+            v["available"] = max(active - v["locked"], 0)
+
+        if queue is not None and queue not in queues and active > 0:
+            queues[queue] = {"locked": 0, "available": active, "next_unlock": None}
+
+        return {"total": total, "active": active, "inactive": total - active, "queues": queues}
 
     async def stats(self):
-        # Fetch all locks
-        qs = "SELECT locks FROM accounts"
-        rs_list = await fetchall(self._db_file, qs)
-        gql_ops_set = set()
-        locks_counts = {}
-
-        for rs in rs_list:
-            locks_json = rs["locks"]
-            locks = json.loads(locks_json) if locks_json else {}
-            for k in locks.keys():
-                gql_ops_set.add(k)
-
-        gql_ops = list(gql_ops_set)
-
-        # Count total, active, inactive accounts
-        qs = "SELECT COUNT(*) as total, SUM(CASE WHEN active THEN 1 ELSE 0 END) as active FROM accounts"
-        qs = log_and_sanitize_query(qs)
-        
-        rs = await fetchone(self._db_file, qs)
-        total_accounts = rs["total"]
-        active_accounts = rs["active"]
-        inactive_accounts = total_accounts - active_accounts
-
-        # Count locked accounts for each queue
-        locks_counts = {f"locked_{queue}": 0 for queue in gql_ops}
-        qs = "SELECT active, locks FROM accounts"
-        qs = log_and_sanitize_query(qs)
-        
-        rs_list = await fetchall(self._db_file, qs)
-        now = datetime.utcnow()
-        for rs in rs_list:
-            active = rs["active"]
-            if not active:
-                continue
-            locks_json = rs["locks"]
-            locks = json.loads(locks_json) if locks_json else {}
-            for queue in gql_ops:
-                lock_time_str = locks.get(queue)
-                if lock_time_str:
-                    lock_time = datetime.fromisoformat(lock_time_str)
-                    if lock_time > now:
-                        locks_counts[f"locked_{queue}"] += 1
-
-        # Build the stats dictionary
-        stats_dict = {
-            "total": total_accounts,
-            "active": active_accounts,
-            "inactive": inactive_accounts,
-        }
-        stats_dict.update(locks_counts)
+        rep = await self.queue_stats()
+        stats_dict = {"total": rep["total"], "active": rep["active"], "inactive": rep["inactive"]}
+        stats_dict.update({f"locked_{k}": v["locked"] for k, v in rep["queues"].items()})
         return stats_dict
 
     async def accounts_info(self):
@@ -5,9 +5,18 @@ from typing_extensions import deprecated
 
 from .accounts_pool import AccountsPool
 from .logger import set_log_level
-from .models import Tweet, User, parse_tweet, parse_tweets, parse_user, parse_users
+from .models import (
+    ParseCtx,
+    Tweet,
+    User,
+    parse_tweet,
+    parse_tweets,
+    parse_user,
+    parse_users,
+)
 from .queue_client import QueueClient
-from .utils import encode_params, find_obj, get_by_path
+from .session import QueueSession
+from .utils import encode_params, rep_index
 
 # OP_{NAME} – {NAME} should be same as second part of GQL ID (required to auto-update script)
 OP_SearchTimeline = "UN1i3zUiCWa-6r-Uaho4fw/SearchTimeline"
@@ -69,6 +78,8 @@ class API:
         debug=False,
         proxy: str | None = None,
         raise_when_no_account=False,
+        session_idle: float | None = None,
+        lazy_tweets=False,
     ):
         if isinstance(pool, AccountsPool):
             self.pool = pool
@@ -79,9 +90,27 @@ class API:
 
         self.proxy = proxy
         self.debug = debug
+        self.lazy_tweets = lazy_tweets  # yield LazyTweet (details parsed on access)
         if self.debug:
             set_log_level("DEBUG")
 
+        # session mode: single item calls (user_by_login, tweet_details, etc) keep account
+        # per queue for `session_idle` seconds after last call, call `close()` when done
+        self._session = None
+        if session_idle is not None:
+            self._session = QueueSession(self.pool, session_idle, debug, proxy=proxy)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        # release accounts kept by session
+        if self._session is not None:
+            await self._session.close()
+
     # general helpers
 
     def _is_end(self, rep: Response, q: str, res: list, cur: str | None, cnt: int, lim: int):
@@ -94,11 +123,6 @@ class API:
 
         return rep if is_res else None, new_total, is_cur and not is_lim
 
-    def _get_cursor(self, obj: dict, cursor_type="Bottom"):
-        if cur := find_obj(obj, lambda x: x.get("cursorType") == cursor_type):
-            return cur.get("value")
-        return None
-
     # gql helpers
 
     async def _gql_items(
@@ -121,8 +145,9 @@ class API:
                 if rep is None:
                     return
 
-                obj = rep.json()
-                els = get_by_path(obj, "entries") or []
+                # page decoded & walked once, reused by parse_tweets / parse_users
+                idx = rep_index(rep)
+                els = idx.entries or []
                 els = [
                     x
                     for x in els
@@ -131,7 +156,7 @@ class API:
                         or x["entryId"].startswith("messageprompt-")
                     )
                 ]
-                cur = self._get_cursor(obj, cursor_type)
+                cur = idx.cursors.get(cursor_type)
 
                 rep, cnt, active = self._is_end(rep, queue, els, cur, cnt, limit)
                 if rep is None:
@@ -142,9 +167,14 @@ class API:
     async def _gql_item(self, op: str, kv: dict, ft: dict | None = None):
         ft = ft or {}
         queue = op.split("/")[-1]
+        params = encode_params({"variables": {**kv}, "features": {**GQL_FEATURES, **ft}})
+
+        if self._session is not None:
+            async with self._session.client(queue) as client:
+                return await client.get(f"{GQL_URL}/{op}", params=params)
+
         async with QueueClient(self.pool, queue, self.debug, proxy=self.proxy) as client:
-            params = {"variables": {**kv}, "features": {**GQL_FEATURES, **ft}}
-            return await client.get(f"{GQL_URL}/{op}", params=encode_params(params))
+            return await client.get(f"{GQL_URL}/{op}", params=params)
 
     # search
 
@@ -163,8 +193,9 @@ class API:
 
     async def search(self, q: str, limit=-1, kv=None):
         async with aclosing(self.search_raw(q, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)  # authors parsed once per pagination
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     yield x
 
     # user_by_id
@@ -253,8 +284,9 @@ class API:
 
     async def tweet_replies(self, twid: int, limit=-1, kv=None):
         async with aclosing(self.tweet_replies_raw(twid, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     if x.inReplyToTweetId == twid:
                         yield x
 
@@ -271,7 +303,7 @@ class API:
     async def followers(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.followers_raw(uid, limit=limit, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, limit):
                     yield x
 
     # verified_followers
@@ -287,7 +319,7 @@ class API:
     async def verified_followers(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.verified_followers_raw(uid, limit=limit, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, limit):
                     yield x
 
     # following
@@ -302,7 +334,7 @@ class API:
     async def following(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.following_raw(uid, limit=limit, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, limit):
                     yield x
 
     # subscriptions
@@ -317,7 +349,7 @@ class API:
     async def subscriptions(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.subscriptions_raw(uid, limit=limit, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, limit):
                     yield x
 
     # retweeters
@@ -332,7 +364,7 @@ class API:
     async def retweeters(self, twid: int, limit=-1, kv=None):
         async with aclosing(self.retweeters_raw(twid, limit=limit, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, limit):
                     yield x
 
     # favoriters
@@ -349,7 +381,7 @@ class API:
     async def favoriters(self, twid: int, limit=-1, kv=None):
         async with aclosing(self.favoriters_raw(twid, limit=limit, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, limit):
                     yield x
 
     # user_tweets
@@ -371,8 +403,9 @@ class API:
 
     async def user_tweets(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.user_tweets_raw(uid, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     yield x
 
     # user_tweets_and_replies
@@ -394,8 +427,9 @@ class API:
 
     async def user_tweets_and_replies(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.user_tweets_and_replies_raw(uid, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     yield x
 
     # user_media
@@ -419,8 +453,9 @@ class API:
 
     async def user_media(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.user_media_raw(uid, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep, limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     # sometimes some tweets without media, so skip them
                     media_count = (
                         len(x.media.photos) + len(x.media.videos) + len(x.media.animated)
@@ -442,8 +477,9 @@ class API:
 
     async def list_timeline(self, list_id: int, limit=-1, kv=None):
         async with aclosing(self.list_timeline_raw(list_id, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep, limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     yield x
 
     # likes
@@ -466,8 +502,9 @@ class API:
     @deprecated("Likes is no longer available in X, see: https://x.com/XDevelopers/status/1800675411086409765")  # fmt: skip
     async def liked_tweets(self, uid: int, limit=-1, kv=None):
         async with aclosing(self.liked_tweets_raw(uid, limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     yield x
 
     # Get current user bookmarks
@@ -492,6 +529,7 @@ class API:
 
     async def bookmarks(self, limit=-1, kv=None):
         async with aclosing(self.bookmarks_raw(limit=limit, kv=kv)) as gen:
+            ctx = ParseCtx(lazy=self.lazy_tweets)
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, limit, ctx.page()):
                     yield x
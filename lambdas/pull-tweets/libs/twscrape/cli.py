@@ -10,10 +10,11 @@ from importlib.metadata import version
 import httpx
 
 from .api import API, AccountsPool
-from .db import get_sqlite_version
+from .db import close_db, get_sqlite_version
 from .logger import logger, set_log_level
 from .login import LoginConfig
 from .models import Tweet, User
+from .transport import close_transports
 from .utils import print_table
 
 
@@ -40,7 +41,7 @@ def to_str(doc: httpx.Response | Tweet | User | None) -> str:
     return tmp if isinstance(tmp, str) else json.dumps(tmp, default=str)
 
 
-async def main(args):
+async def main(args, pool: AccountsPool):
     if args.debug:
         set_log_level("DEBUG")
 
@@ -50,8 +51,6 @@ async def main(args):
         print(f"SQLite runtime: {sqlite3.sqlite_version} ({await get_sqlite_version()})")
         return
 
-    login_config = LoginConfig(getattr(args, "email_first", False), getattr(args, "manual", False))
-    pool = AccountsPool(args.db, login_config=login_config)
     api = API(pool, debug=args.debug)
 
     if args.command == "accounts":
@@ -59,14 +58,16 @@ async def main(args):
         return
 
     if args.command == "stats":
-        rep = await pool.stats()
+        rep = await pool.queue_stats()
         total, active, inactive = rep["total"], rep["active"], rep["inactive"]
 
         res = []
-        for k, v in rep.items():
-            if not k.startswith("locked") or v == 0:
+        for k, v in rep["queues"].items():
+            if v["locked"] == 0:
                 continue
-            res.append({"queue": k, "locked": v, "available": max(active - v, 0)})
+            nat = pool._format_unlock_ts(v["next_unlock"])
+            item = {"queue": k, "locked": v["locked"], "available": v["available"], "next": nat}
+            res.append(item)
 
         res = sorted(res, key=lambda x: x["locked"], reverse=True)
         print_table(res, hr_after=True)
@@ -74,7 +75,8 @@ async def main(args):
         return
 
     if args.command == "add_accounts":
-        await pool.load_from_file(args.file_path, args.line_format)
+        rep = await pool.load_from_file(args.file_path, args.line_format)
+        print(f"\nAdded: {rep['added']} - Skipped (duplicates): {len(rep['skipped'])}")
         print("\nNow run:\ntwscrape login_accounts")
         return
 
@@ -83,16 +85,16 @@ async def main(args):
         return
 
     if args.command == "login_accounts":
-        stats = await pool.login_all()
+        stats = await pool.login_all(concurrency=args.concurrency, per_proxy=args.per_proxy)
         print(stats)
         return
 
     if args.command == "relogin_failed":
-        await pool.relogin_failed()
+        await pool.relogin_failed(concurrency=args.concurrency, per_proxy=args.per_proxy)
         return
 
     if args.command == "relogin":
-        await pool.relogin(args.usernames)
+        await pool.relogin(args.usernames, concurrency=args.concurrency, per_proxy=args.per_proxy)
         return
 
     if args.command == "reset_locks":
@@ -119,6 +121,17 @@ async def main(args):
         print(to_str(doc))
 
 
+async def run_main(args):
+    login_config = LoginConfig(getattr(args, "email_first", False), getattr(args, "manual", False))
+    pool = AccountsPool(args.db, login_config=login_config)
+    try:
+        await main(args, pool)
+    finally:
+        await pool.close()  # writes buffered lock / usage updates
+        await close_transports()
+        await close_db()
+
+
 def custom_help(p):
     buffer = io.StringIO()
     p.print_help(buffer)
@@ -177,6 +190,8 @@ def run():
     for cmd in login_commands:
         cmd.add_argument("--email-first", action="store_true", help="Check email first")
         cmd.add_argument("--manual", action="store_true", help="Enter email code manually")
+        cmd.add_argument("--concurrency", type=int, default=1, help="Parallel logins")
+        cmd.add_argument("--per-proxy", type=int, default=None, help="Parallel logins per proxy")
 
     subparsers.add_parser("reset_locks", help="Reset all locks")
     subparsers.add_parser("delete_inactive", help="Delete inactive accounts")
@@ -205,6 +220,6 @@ def run():
         return custom_help(p)
 
     try:
-        asyncio.run(main(args))
+        asyncio.run(run_main(args))
     except KeyboardInterrupt:
         pass
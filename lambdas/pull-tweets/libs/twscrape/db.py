@@ -1,27 +1,32 @@
 import asyncio
+import json
+import os
 import random
 import sqlite3
-from collections import defaultdict
+import time
+from contextlib import asynccontextmanager
 
 import aiosqlite
 
 from .logger import logger
+from .utils import get_env_bool, utc
 
 MIN_SQLITE_VERSION = "3.24"
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+BUSY_TIMEOUT_MS = 5_000
 
-_lock = asyncio.Lock()
+_version_checked = False
 
 
 def lock_retry(max_retries=10):
-    # this lock decorator has double nature:
-    # 1. it uses asyncio lock in same process
-    # 2. it retries when db locked by other process (eg. two cli instances running)
+    # in same process writes are serialized by DB.writer lock and reads run in parallel,
+    # other processes (eg. two cli instances running) are handled by busy_timeout,
+    # this decorator only retries when busy_timeout was not enough
     def decorator(func):
         async def wrapper(*args, **kwargs):
             for i in range(max_retries):
                 try:
-                    async with _lock:
-                        return await func(*args, **kwargs)
+                    return await func(*args, **kwargs)
                 except sqlite3.OperationalError as e:
                     if i == max_retries - 1 or "database is locked" not in str(e):
                         raise e
@@ -41,6 +46,10 @@ async def get_sqlite_version():
 
 
 async def check_version():
+    global _version_checked
+    if _version_checked:
+        return
+
     ver = await get_sqlite_version()
     ver = ".".join(ver.split(".")[:2])
 
@@ -51,6 +60,8 @@ async def check_version():
     except ValueError:
         pass
 
+    _version_checked = True
+
 
 async def migrate(db: aiosqlite.Connection):
     async with db.execute("PRAGMA user_version") as cur:
@@ -65,14 +76,13 @@ async def migrate(db: aiosqlite.Connection):
             email TEXT NOT NULL COLLATE NOCASE,
             email_password TEXT NOT NULL,
             user_agent TEXT NOT NULL,
-            active BOOLEAN DEFAULT FALSE NOT NULL,
+            active BOOLEAN DEFAULT 0 NOT NULL,
             locks TEXT DEFAULT '{}' NOT NULL,
             headers TEXT DEFAULT '{}' NOT NULL,
             cookies TEXT DEFAULT '{}' NOT NULL,
             proxy TEXT DEFAULT NULL,
             error_msg TEXT DEFAULT NULL
         );"""
-        qs = log_and_sanitize_query(qs)
         await db.execute(qs)
 
     async def v2():
@@ -85,11 +95,62 @@ async def migrate(db: aiosqlite.Connection):
     async def v4():
         await db.execute("ALTER TABLE accounts ADD COLUMN mfa_code TEXT DEFAULT NULL")
 
+    async def v5():
+        # per-queue locks & stats moved from json columns to own tables, so free account
+        # can be found with index; json columns kept as is, so old db files still readable
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS account_locks (
+            username TEXT NOT NULL COLLATE NOCASE,
+            queue TEXT NOT NULL,
+            locked_until INTEGER NOT NULL,
+            PRIMARY KEY (username, queue)
+        );""")
+        await db.execute("""
+        CREATE INDEX IF NOT EXISTS account_locks_queue ON account_locks (queue, locked_until);""")
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS account_stats (
+            username TEXT NOT NULL COLLATE NOCASE,
+            queue TEXT NOT NULL,
+            req_count INTEGER DEFAULT 0 NOT NULL,
+            PRIMARY KEY (username, queue)
+        );""")
+        await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS accounts_after_delete AFTER DELETE ON accounts BEGIN
+            DELETE FROM account_locks WHERE username = old.username;
+            DELETE FROM account_stats WHERE username = old.username;
+        END;""")
+
+        # json1 extension is not available everywhere (eg. lambda runtime), so copy in python
+        locks, stats = [], []
+        async with db.execute("SELECT username, locks, stats FROM accounts") as cur:
+            for username, locks_json, stats_json in await cur.fetchall():
+                for queue, until in json.loads(locks_json or "{}").items():
+                    until = int(utc.from_iso(until).timestamp())
+                    locks.append({"username": username, "queue": queue, "locked_until": until})
+
+                for queue, count in json.loads(stats_json or "{}").items():
+                    if isinstance(count, int):
+                        stats.append({"username": username, "queue": queue, "req_count": count})
+
+        await db.executemany(
+            "INSERT OR REPLACE INTO account_locks VALUES (:username, :queue, :locked_until)", locks
+        )
+        await db.executemany(
+            "INSERT OR REPLACE INTO account_stats VALUES (:username, :queue, :req_count)", stats
+        )
+
+    async def v6():
+        # lock taken by claim is lease of its owner (renewed by heartbeat, see QueueClient),
+        # locks set by lock_until (rate limits) have no owner
+        await db.execute("ALTER TABLE account_locks ADD COLUMN owner TEXT DEFAULT NULL")
+
     migrations = {
         1: v1,
         2: v2,
         3: v3,
         4: v4,
+        5: v5,
+        6: v6,
     }
 
     # logger.debug(f"Current migration v{uv} (latest v{len(migrations)})")
@@ -106,48 +167,246 @@ async def migrate(db: aiosqlite.Connection):
 
 
 class DB:
-    _init_queries: defaultdict[str, list[str]] = defaultdict(list)
-    _init_once: defaultdict[str, bool] = defaultdict(bool)
-
-    def __init__(self, db_path):
+    # long-lived connections per db file: one writer and a small pool of readers,
+    # so helpers below do not pay connection setup (and worker thread start) per query;
+    # in WAL mode readers run in parallel with each other and with the writer,
+    # writes are serialized by single writer connection and its lock
+    _instances: dict[str, "DB"] = {}
+    readers_size = 4
+
+    def __init__(self, db_path: str):
         self.db_path = db_path
-        self.conn = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._writer: aiosqlite.Connection | None = None
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._open_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self.wal = False
+
+    @classmethod
+    async def get(cls, db_path: str) -> "DB":
+        db = cls._instances.get(db_path)
+        loop = asyncio.get_running_loop()
+
+        # connections are bound to event loop (eg. asyncio.run per lambda request)
+        if db is not None and db.loop is not loop:
+            db._abandon()
+            db = None
+
+        if db is None:
+            db = cls._instances[db_path] = cls(db_path)
+            db.loop = loop
+
+        return db
 
-    async def __aenter__(self):
-        await check_version()
-        db = await aiosqlite.connect(self.db_path)
+    async def _connect(self):
+        db = await _connect(self.db_path)
         db.row_factory = aiosqlite.Row
+        return db
 
-        if not self._init_once[self.db_path]:
-            await migrate(db)
-            self._init_once[self.db_path] = True
+    async def _open_writer(self) -> aiosqlite.Connection:
+        async with self._open_lock:
+            if self._writer is None:
+                await check_version()
+                db = await self._connect()
+                self.wal = await set_wal(db)
+                await migrate(db)
+                self._writer = db
+
+        return self._writer
+
+    @asynccontextmanager
+    async def writer(self):
+        db = self._writer or await self._open_writer()
+        async with self._write_lock:
+            try:
+                yield db
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+
+    @asynccontextmanager
+    async def reader(self):
+        writer = self._writer or await self._open_writer()  # also runs migrations
+        if not self.wal:
+            # without WAL readers will block on writer anyway (also :memory: is per connection)
+            async with self._write_lock:
+                yield writer
+            return
+
+        if not self._idle.empty():
+            db = self._idle.get_nowait()
+        elif len(self._readers) < self.readers_size:
+            db = await self._connect()
+            self._readers.append(db)
+        else:
+            db = await self._idle.get()
+
+        try:
+            yield db
+        finally:
+            self._idle.put_nowait(db)
+
+    async def checkpoint(self):
+        # move WAL content to main db file (eg. before uploading it somewhere)
+        if self._writer is not None and self.wal:
+            async with self._write_lock:
+                await self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def close(self):
+        if self._instances.get(self.db_path) is self:
+            del self._instances[self.db_path]
+
+        await self.checkpoint()
+
+        conns = [x for x in [self._writer, *self._readers] if x is not None]
+        self._writer, self._readers = None, []
+        for x in conns:
+            await x.close()
+
+    def _abandon(self):
+        # previous event loop is gone, only stop worker threads
+        conns = [x for x in [self._writer, *self._readers] if x is not None]
+        self._writer, self._readers = None, []
+        for x in conns:
+            try:
+                x.stop()
+            except Exception:
+                pass
+
+
+async def _connect(db_path: str) -> aiosqlite.Connection:
+    db = aiosqlite.connect(db_path)
+    # connections are kept open between calls, do not block interpreter exit when pool not closed
+    thread = getattr(db, "_thread", db)
+    thread.daemon = True
+    db = await db
+    await db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return db
+
+
+async def set_wal(db: aiosqlite.Connection) -> bool:
+    # journal mode stored in db file, so it set once and applied to all connections
+    async with db.execute("PRAGMA journal_mode = WAL") as cur:
+        rs = await cur.fetchone()
+        mode = str(rs[0]).lower() if rs else ""
+
+    if mode != "wal":
+        logger.debug(f"WAL mode not available for accounts db (journal_mode={mode})")
+        return False
+
+    await db.execute("PRAGMA synchronous = NORMAL")
+    return True
+
+
+@asynccontextmanager
+async def transaction(db_path: str, immediate=False):
+    # several statements in one write transaction, committed on exit (traced as a whole)
+    async with _traced("TRANSACTION", None), (await DB.get(db_path)).writer() as db:
+        if immediate:
+            # take write lock at start, so other processes can't change rows read inside
+            await db.execute("BEGIN IMMEDIATE")
+        yield db
+
+
+async def checkpoint_db(db_path: str):
+    db = DB._instances.get(db_path)
+    if db is not None:
+        await db.checkpoint()
+
+
+async def close_db(db_path: str | None = None):
+    dbs = list(DB._instances.values())
+    for db in dbs:
+        if db_path is None or db.db_path == db_path:
+            await db.close()
 
-        self.conn = db
-        return db
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.conn:
-            await self.conn.commit()
-            await self.conn.close()
+class QueryTrace:
+    # query tracing, off by default (every log line is paid for on lambda); when enabled
+    # queries logged with duration (including wait for connection) and redacted params,
+    # `sample` is share of queries to log, `slow_ms` logs only queries slower than that;
+    # can be enabled with TWS_TRACE_SQL=1 (+ TWS_TRACE_SQL_SAMPLE, TWS_TRACE_SQL_SLOW_MS)
+
+    SECRET_PARAMS = {"password", "email_password", "mfa_code", "cookies", "headers"}
+
+    def __init__(self, enabled=False, sample=1.0, slow_ms: float = 0, level="DEBUG"):
+        self.enabled = enabled
+        self.sample = sample
+        self.slow_ms = slow_ms
+        self.level = level
+
+    def start(self) -> float | None:
+        if not self.enabled or (self.sample < 1 and random.random() >= self.sample):
+            return None
+        return time.perf_counter()
+
+    def end(self, t0: float | None, qs: str, params: dict | list[dict] | None, error=None):
+        if t0 is None:
+            return
+
+        ms = (time.perf_counter() - t0) * 1000
+        if ms < self.slow_ms and error is None:
+            return
+
+        qs = " ".join(qs.split())
+        if isinstance(params, list):
+            info = f"x{len(params)} {self.redact(params[0]) if params else ''}"
+        else:
+            info = self.redact(params) if params else ""
+
+        msg = f"SQL {ms:.1f}ms: {qs} {info}".rstrip()
+        if error is not None:
+            msg = f"{msg} failed: {error}"
+        logger.log(self.level, msg)
+
+    def redact(self, params: dict):
+        return {k: "***" if k in self.SECRET_PARAMS and v else v for k, v in params.items()}
+
+
+_trace: QueryTrace | None = None
+
+
+def set_query_trace(trace: QueryTrace):
+    global _trace
+    _trace = trace
+
+
+def get_query_trace() -> QueryTrace:
+    global _trace
+    if _trace is None:
+        _trace = QueryTrace(
+            enabled=get_env_bool("TWS_TRACE_SQL"),
+            sample=float(os.getenv("TWS_TRACE_SQL_SAMPLE", "1")),
+            slow_ms=float(os.getenv("TWS_TRACE_SQL_SLOW_MS", "0")),
+        )
+    return _trace
+
+
+@asynccontextmanager
+async def _traced(qs: str, params: dict | list[dict] | None):
+    trace = get_query_trace()
+    t0 = trace.start()
+    try:
+        yield
+    except Exception as e:
+        trace.end(t0, qs, params, error=e)
+        raise
+    else:
+        trace.end(t0, qs, params)
 
 
 @lock_retry()
 async def execute(db_path: str, qs: str, params: dict | None = None):
-    print('within execute')
-    qs = log_and_sanitize_query(qs, params)
-    async with DB(db_path) as db:
+    async with _traced(qs, params), (await DB.get(db_path)).writer() as db:
         await db.execute(qs, params)
 
 
 @lock_retry()
 async def fetchone(db_path: str, qs: str, params: dict | None = None):
-    print('within fetchone')
-    
-    qs = log_and_sanitize_query(qs, params)
-    async with DB(db_path) as db:
-        print(f"[DEBUG] Database connection opened for path: {db_path}")
-        print(f"[DEBUG] Query: {qs}")
-        print(f"[DEBUG] Parameters: {params}")
+    async with _traced(qs, params), (await DB.get(db_path)).reader() as db:
         async with db.execute(qs, params) as cur:
             row = await cur.fetchone()
             return row
@@ -155,9 +414,7 @@ async def fetchone(db_path: str, qs: str, params: dict | None = None):
 
 @lock_retry()
 async def fetchall(db_path: str, qs: str, params: dict | None = None):
-    print('within fetchall')
-    qs = log_and_sanitize_query(qs, params)
-    async with DB(db_path) as db:
+    async with _traced(qs, params), (await DB.get(db_path)).reader() as db:
         async with db.execute(qs, params) as cur:
             rows = await cur.fetchall()
             return rows
@@ -165,13 +422,5 @@ async def fetchall(db_path: str, qs: str, params: dict | None = None):
 
 @lock_retry()
 async def executemany(db_path: str, qs: str, params: list[dict]):
-    print('within executemany')
-    qs = log_and_sanitize_query(qs, params)
-    async with DB(db_path) as db:
+    async with _traced(qs, params), (await DB.get(db_path)).writer() as db:
         await db.executemany(qs, params)
-
-def log_and_sanitize_query(qs: str, params=None):
-    print(f"Executing Query: {qs}")
-    if params:
-        print(f"With Parameters: {params}")
-    return qs.replace("FALSE", "0").replace("TRUE", "1").replace("false", "0").replace("true", "1")
@@ -0,0 +1,114 @@
+import time
+from dataclasses import dataclass
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+@dataclass
+class AccountHealth:
+    score: float = 1.0  # moving average of request outcomes (1 – ok, 0 – failed)
+    state: str = CLOSED
+    failures: int = 0  # in a row
+    trips: int = 0  # times opened in a row, cooldown grows with it
+    open_until: float = 0.0
+    failed_at: float = 0.0
+    probing: bool = False
+
+
+class HealthTracker:
+    # per-account circuit breaker over recent request outcomes (timeouts, dependency and unknown
+    # errors), kept in memory of process. After `failures` errors in a row account is not given
+    # out for `cooldown` seconds (doubled on each next trip), then one probe claim is allowed
+    # (half-open) and its first outcome closes or opens circuit again. Accounts without
+    # records are healthy, so nothing is tracked while requests succeed; closed accounts
+    # without failures for `cooldown` seconds are forgotten.
+
+    def __init__(self, failures=3, cooldown=60.0, max_cooldown=900.0, alpha=0.3):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self._items: dict[str, AccountHealth] = {}
+
+    def get(self, username: str) -> AccountHealth | None:
+        return self._items.get(username.lower())
+
+    def report(self, username: str, ok: bool):
+        key = username.lower()
+        x = self._items.get(key)
+        if x is None:
+            if ok:
+                return
+            x = self._items[key] = AccountHealth()
+
+        x.score = x.score * (1 - self.alpha) + self.alpha * (1 if ok else 0)
+        x.probing = False
+
+        if ok:
+            x.failures = 0
+            if x.state != CLOSED or x.score >= 0.95:
+                del self._items[key]  # probe succeeded or recovered
+            return
+
+        x.failures += 1
+        x.failed_at = time.monotonic()
+        if x.state == HALF_OPEN or x.failures >= self.failures:
+            x.trips += 1
+            x.state = OPEN
+            x.open_until = time.monotonic() + min(
+                self.cooldown * 2 ** (x.trips - 1), self.max_cooldown
+            )
+
+    def allows(self, username: str) -> bool:
+        x = self._items.get(username.lower())
+        if x is None or x.state == CLOSED:
+            return True
+
+        if x.state == OPEN:
+            if time.monotonic() < x.open_until:
+                return False
+            x.state = HALF_OPEN
+
+        return not x.probing
+
+    def claimed(self, username: str):
+        x = self._items.get(username.lower())
+        if x is not None and x.state == HALF_OPEN:
+            x.probing = True
+
+    def released(self, username: str):
+        # probe ended without outcome (eg. account rotated), let next claim probe
+        x = self._items.get(username.lower())
+        if x is not None:
+            x.probing = False
+
+    def has_unhealthy(self) -> bool:
+        now = time.monotonic()
+        for k, x in list(self._items.items()):
+            if x.state == CLOSED and not x.probing and now - x.failed_at > self.cooldown:
+                del self._items[k]
+        return bool(self._items)
+
+    def probe_ready(self) -> bool:
+        # some account can be probed (cooldown passed and no probe running)
+        now = time.monotonic()
+        for x in self._items.values():
+            if x.state == HALF_OPEN and not x.probing or x.state == OPEN and now >= x.open_until:
+                return True
+        return False
+
+    def skipped(self) -> list[str]:
+        # not given out (open circuit or probe running), valid while probe_ready() is False
+        return [k for k, x in self._items.items() if x.state != CLOSED]
+
+    def degraded(self) -> list[str]:
+        # given out only when no healthy account is free
+        return [k for k, x in self._items.items() if x.state == CLOSED]
+
+    def rank(self, username: str):
+        # sort key: half-open account goes first (single probe request, otherwise it never
+        # recovers while others available), then healthy, then degraded by score
+        x = self._items.get(username.lower())
+        if x is None:
+            return (1, 0.0)
+        return (2 if x.state == CLOSED else 0, -x.score)
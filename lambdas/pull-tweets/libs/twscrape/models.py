@@ -6,26 +6,29 @@ import re
 import string
 import sys
 import traceback
-from dataclasses import asdict, dataclass, field
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from typing import Generator, Optional, Union
 
 import httpx
 
 from .logger import logger
-from .utils import find_item, get_or, int_or, to_old_rep, utc
+from .serializer import to_dict
+from .utils import find_item, flat_obj, get_or, int_or, rep_index, to_old_rep, utc
 
 
-@dataclass
+@dataclass(slots=True)
 class JSONTrait:
-    def dict(self):
-        return asdict(self)
+    # `only` – top-level fields to include, see serializer.to_dict
+    def dict(self, only: list[str] | None = None):
+        return to_dict(self, only=only)
 
-    def json(self):
-        return json.dumps(self.dict(), default=str)
+    def json(self, only: list[str] | None = None):
+        return json.dumps(to_dict(self, str, only), default=str)
 
 
-@dataclass
+@dataclass(slots=True)
 class Coordinates(JSONTrait):
     longitude: float
     latitude: float
@@ -41,7 +44,7 @@ class Coordinates(JSONTrait):
         return None
 
 
-@dataclass
+@dataclass(slots=True)
 class Place(JSONTrait):
     id: str
     fullName: str
@@ -62,7 +65,7 @@ class Place(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class TextLink(JSONTrait):
     url: str
     text: str | None
@@ -82,7 +85,7 @@ class TextLink(JSONTrait):
         return tmp
 
 
-@dataclass
+@dataclass(slots=True)
 class UserRef(JSONTrait):
     id: int
     id_str: str
@@ -100,7 +103,7 @@ class UserRef(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class User(JSONTrait):
     id: int
     id_str: str
@@ -132,11 +135,12 @@ class User(JSONTrait):
 
     @staticmethod
     def parse(obj: dict, res=None):
+        id_str, username = obj["id_str"], obj["screen_name"]
         return User(
-            id=int(obj["id_str"]),
-            id_str=obj["id_str"],
-            url=f'https://x.com/{obj["screen_name"]}',
-            username=obj["screen_name"],
+            id=int(id_str),
+            id_str=id_str,
+            url=f"https://x.com/{username}",
+            username=username,
             displayname=obj["name"],
             rawDescription=obj["description"],
             created=email.utils.parsedate_to_datetime(obj["created_at"]),
@@ -158,7 +162,7 @@ class User(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Tweet(JSONTrait):
     id: int
     id_str: str
@@ -198,9 +202,11 @@ class Tweet(JSONTrait):
     # renderedContent: str
     # vibe: Optional["Vibe"] = None
 
-    @staticmethod
-    def parse(obj: dict, res: dict):
-        tw_usr = User.parse(res["users"][obj["user_id_str"]])
+    @classmethod
+    def parse(cls, obj: dict, res: dict, ctx: Optional["ParseCtx"] = None):
+        id_str, conv_id = obj["id_str"], obj["conversation_id_str"]
+        usr_obj = res["users"][obj["user_id_str"]]
+        tw_usr = ctx.user(usr_obj) if ctx else User.parse(usr_obj)
 
         rt_id_path = [
             "retweeted_status_id_str",
@@ -217,10 +223,11 @@ class Tweet(JSONTrait):
         rt_obj = get_or(res, f"tweets.{_first(obj, rt_id_path)}")
         qt_obj = get_or(res, f"tweets.{_first(obj, qt_id_path)}")
 
-        url = f'https://x.com/{tw_usr.username}/status/{obj["id_str"]}'
-        doc = Tweet(
-            id=int(obj["id_str"]),
-            id_str=obj["id_str"],
+        url = f"https://x.com/{tw_usr.username}/status/{id_str}"
+        doc = cls._make(
+            obj,
+            id=int(id_str),
+            id_str=id_str,
             url=url,
             date=email.utils.parsedate_to_datetime(obj["created_at"]),
             user=tw_usr,
@@ -231,27 +238,15 @@ class Tweet(JSONTrait):
             likeCount=obj["favorite_count"],
             quoteCount=obj["quote_count"],
             bookmarkedCount=get_or(obj, "bookmark_count", 0),
-            conversationId=int(obj["conversation_id_str"]),
-            conversationIdStr=obj["conversation_id_str"],
-            hashtags=[x["text"] for x in get_or(obj, "entities.hashtags", [])],
-            cashtags=[x["text"] for x in get_or(obj, "entities.symbols", [])],
-            mentionedUsers=[UserRef.parse(x) for x in get_or(obj, "entities.user_mentions", [])],
-            links=_parse_links(
-                obj, ["entities.urls", "note_tweet.note_tweet_results.result.entity_set.urls"]
-            ),
+            conversationId=int(conv_id),
+            conversationIdStr=conv_id,
             viewCount=_get_views(obj, rt_obj or {}),
-            retweetedTweet=Tweet.parse(rt_obj, res) if rt_obj else None,
-            quotedTweet=Tweet.parse(qt_obj, res) if qt_obj else None,
-            place=Place.parse(obj["place"]) if obj.get("place") else None,
-            coordinates=Coordinates.parse(obj),
+            retweetedTweet=_parse_nested(rt_obj, res, ctx, cls),
+            quotedTweet=_parse_nested(qt_obj, res, ctx, cls),
             inReplyToTweetId=int_or(obj, "in_reply_to_status_id_str"),
             inReplyToTweetIdStr=get_or(obj, "in_reply_to_status_id_str"),
             inReplyToUser=_get_reply_user(obj, res),
             source=obj.get("source", None),
-            sourceUrl=_get_source_url(obj),
-            sourceLabel=_get_source_label(obj),
-            media=Media.parse(obj),
-            card=_parse_card(obj, url),
             possibly_sensitive=obj.get("possibly_sensitive", None),
         )
 
@@ -264,8 +259,68 @@ class Tweet(JSONTrait):
 
         return doc
 
+    @classmethod
+    def _make(cls, obj: dict, **kwargs):
+        details = {k: fn(obj, kwargs["url"]) for k, fn in _TWEET_DETAILS.items()}
+        return cls(**kwargs, **details)
+
+
+# fields of Tweet parsed from raw object only, see LazyTweet
+_TWEET_DETAILS = {
+    "hashtags": lambda obj, url: [x["text"] for x in get_or(obj, "entities.hashtags", [])],
+    "cashtags": lambda obj, url: [x["text"] for x in get_or(obj, "entities.symbols", [])],
+    "mentionedUsers": lambda obj, url: [
+        UserRef.parse(x) for x in get_or(obj, "entities.user_mentions", [])
+    ],
+    "links": lambda obj, url: _parse_links(
+        obj, ["entities.urls", "note_tweet.note_tweet_results.result.entity_set.urls"]
+    ),
+    "place": lambda obj, url: Place.parse(obj["place"]) if obj.get("place") else None,
+    "coordinates": lambda obj, url: Coordinates.parse(obj),
+    "sourceUrl": lambda obj, url: _get_source_url(obj),
+    "sourceLabel": lambda obj, url: _get_source_label(obj),
+    "media": lambda obj, url: Media.parse(obj),
+    "card": lambda obj, url: _parse_card(obj, url),
+}
+
+
+class LazyTweet(Tweet):
+    # Tweet which parses details (entities, links, media, card, place, source) from raw object
+    # on first access, so consumers reading few fields skip most of parsing. dict() / json()
+    # read all fields. Raw object kept while tweet alive: saves parse time, not memory.
+    # Enabled with API(lazy_tweets=True) or ParseCtx(lazy=True)
+
+    __slots__ = ("_obj",)
+
+    @classmethod
+    def _make(cls, obj: dict, **kwargs):
+        doc = object.__new__(cls)
+        for x in fields(cls):
+            if x.name not in _TWEET_DETAILS:
+                setattr(doc, x.name, kwargs.get(x.name, x.default))
+        doc._obj = obj
+        return doc
+
+
+def _lazy_field(name: str):
+    slot, parse = Tweet.__dict__[name], _TWEET_DETAILS[name]
+
+    def get(self: LazyTweet):
+        try:
+            return slot.__get__(self)
+        except AttributeError:  # slot not set yet
+            val = parse(self._obj, self.url)
+            slot.__set__(self, val)
+            return val
+
+    return property(get, slot.__set__)
+
+
+for _name in _TWEET_DETAILS:
+    setattr(LazyTweet, _name, _lazy_field(_name))
+
 
-@dataclass
+@dataclass(slots=True)
 class MediaPhoto(JSONTrait):
     url: str
 
@@ -274,7 +329,7 @@ class MediaPhoto(JSONTrait):
         return MediaPhoto(url=obj["media_url_https"])
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaVideo(JSONTrait):
     thumbnailUrl: str
     variants: list["MediaVideoVariant"]
@@ -293,7 +348,7 @@ class MediaVideo(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaAnimated(JSONTrait):
     thumbnailUrl: str
     videoUrl: str
@@ -309,7 +364,7 @@ class MediaAnimated(JSONTrait):
             return None
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaVideoVariant(JSONTrait):
     contentType: str
     bitrate: int
@@ -324,7 +379,7 @@ class MediaVideoVariant(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Media(JSONTrait):
     photos: list[MediaPhoto] = field(default_factory=list)
     videos: list[MediaVideo] = field(default_factory=list)
@@ -357,12 +412,12 @@ class Media(JSONTrait):
         return Media(photos=photos, videos=videos, animated=animated)
 
 
-@dataclass
+@dataclass(slots=True)
 class Card(JSONTrait):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class SummaryCard(Card):
     title: str
     description: str
@@ -373,20 +428,20 @@ class SummaryCard(Card):
     _type: str = "summary"
 
 
-@dataclass
+@dataclass(slots=True)
 class PollOption(JSONTrait):
     label: str
     votesCount: int
 
 
-@dataclass
+@dataclass(slots=True)
 class PollCard(Card):
     options: list[PollOption]
     finished: bool
     _type: str = "poll"
 
 
-@dataclass
+@dataclass(slots=True)
 class BroadcastCard(Card):
     title: str
     url: str
@@ -394,7 +449,7 @@ class BroadcastCard(Card):
     _type: str = "broadcast"
 
 
-@dataclass
+@dataclass(slots=True)
 class AudiospaceCard(Card):
     url: str
     _type: str = "audiospace"
@@ -547,9 +602,46 @@ def _parse_card(obj: dict, url: str):
     return None
 
 
+class ParseCtx:
+    # parsed objects of response by id: author of many tweets or tweet both quoted and listed
+    # in timeline parsed once and shared by all tweets referencing it. `page()` gives context
+    # for next page of same pagination, which reuses users (up to MAX_USERS) but not tweets
+
+    MAX_USERS = 5000
+
+    def __init__(self, users: dict[str, User] | None = None, lazy=False):
+        self.users = users if users is not None else {}
+        self.tweets: dict[str, Tweet] = {}
+        self.lazy = lazy
+
+    def page(self) -> "ParseCtx":
+        if len(self.users) >= self.MAX_USERS:
+            self.users = {}
+        return ParseCtx(self.users, lazy=self.lazy)
+
+    def user(self, obj: dict) -> User:
+        doc = self.users.get(obj["id_str"])
+        if doc is None:
+            doc = self.users[obj["id_str"]] = User.parse(obj)
+        return doc
+
+    def tweet(self, obj: dict, res: dict) -> Tweet:
+        doc = self.tweets.get(obj["id_str"])
+        if doc is None:
+            cls = LazyTweet if self.lazy else Tweet
+            doc = self.tweets[obj["id_str"]] = cls.parse(obj, res, self)
+        return doc
+
+
 # internal helpers
 
 
+def _parse_nested(obj: dict | None, res: dict, ctx: ParseCtx | None, cls: type[Tweet]):
+    if not obj:
+        return None
+    return ctx.tweet(obj, res) if ctx else cls.parse(obj, res)
+
+
 def _get_reply_user(tw_obj: dict, res: dict):
     user_id = tw_obj.get("in_reply_to_user_id_str", None)
     if user_id is None:
@@ -609,6 +701,14 @@ def _get_views(obj: dict, rt_obj: dict):
     return None
 
 
+def _dump_default(x):
+    # objects of to_old_rep are views over response (utils.LegacyView)
+    if isinstance(x, Mapping):
+        x = flat_obj(x)  # cached merged dict of view, not copied again
+        return x if isinstance(x, dict) else dict(x)
+    return str(x)
+
+
 def _write_dump(kind: str, e: Exception, x: dict, obj: dict):
     uniq = "".join(random.choice(string.ascii_lowercase) for _ in range(5))
     time = utc.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -619,25 +719,25 @@ def _write_dump(kind: str, e: Exception, x: dict, obj: dict):
         msg = [
             f"Error parsing {kind}. Error: {type(e)}",
             traceback.format_exc(),
-            json.dumps(x, default=str),
-            json.dumps(obj, default=str),
+            json.dumps(x, default=_dump_default),
+            json.dumps(obj, default=_dump_default),
         ]
         fp.write("\n\n".join(msg))
 
     logger.error(f"Failed to parse response of {kind}, writing dump to {dumpfile}")
 
 
-def _parse_items(rep: httpx.Response, kind: str, limit: int = -1):
+def _parse_items(rep: httpx.Response, kind: str, limit: int = -1, ctx: ParseCtx | None = None):
+    ctx = ctx or ParseCtx()
     if kind == "user":
-        Cls, key = User, "users"
+        parse, key = lambda x, _: ctx.user(x), "users"
     elif kind == "tweet":
-        Cls, key = Tweet, "tweets"
+        parse, key = ctx.tweet, "tweets"
     else:
         raise ValueError(f"Invalid kind: {kind}")
 
     # check for dict, because httpx.Response can be mocked in tests with different type
-    res = rep if isinstance(rep, dict) else rep.json()
-    obj = to_old_rep(res)
+    obj = to_old_rep(rep if isinstance(rep, dict) else rep_index(rep))
 
     ids = set()
     for x in obj[key].values():
@@ -648,7 +748,7 @@ def _parse_items(rep: httpx.Response, kind: str, limit: int = -1):
             pass
 
         try:
-            tmp = Cls.parse(x, obj)
+            tmp = parse(x, obj)
             if tmp.id not in ids:
                 ids.add(tmp.id)
                 yield tmp
@@ -660,12 +760,16 @@ def _parse_items(rep: httpx.Response, kind: str, limit: int = -1):
 # public helpers
 
 
-def parse_tweets(rep: httpx.Response, limit: int = -1) -> Generator[Tweet, None, None]:
-    return _parse_items(rep, "tweet", limit)  # type: ignore
+def parse_tweets(
+    rep: httpx.Response, limit: int = -1, ctx: ParseCtx | None = None
+) -> Generator[Tweet, None, None]:
+    return _parse_items(rep, "tweet", limit, ctx)  # type: ignore
 
 
-def parse_users(rep: httpx.Response, limit: int = -1) -> Generator[User, None, None]:
-    return _parse_items(rep, "user", limit)  # type: ignore
+def parse_users(
+    rep: httpx.Response, limit: int = -1, ctx: ParseCtx | None = None
+) -> Generator[User, None, None]:
+    return _parse_items(rep, "user", limit, ctx)  # type: ignore
 
 
 def parse_tweet(rep: httpx.Response, twid: int) -> Tweet | None:
@@ -0,0 +1,163 @@
+from dataclasses import fields
+from functools import lru_cache
+
+from .account import Account
+
+# AccountsPool queries, built once on import. Written in sqlite dialect: lambda's sqlite has
+# no TRUE / FALSE literals, so booleans are 1 / 0 and values always bound as parameters.
+
+# locks & stats are stored in own tables, see migration v5 in db.py and Account.from_rs
+QUEUE_COLS = """
+(SELECT group_concat(queue || ':' || locked_until) FROM account_locks WHERE username = {t}.username) AS queue_locks,
+(SELECT group_concat(queue || ':' || req_count) FROM account_stats WHERE username = {t}.username) AS queue_stats
+"""
+
+ACCOUNT_COLS = f"a.*, {QUEUE_COLS.format(t='a')}"
+
+# active and not locked for :queue at :now (accounts table alias is "a")
+FREE_ACCOUNT = """
+a.active = 1 AND NOT EXISTS (
+    SELECT 1 FROM account_locks l
+    WHERE l.username = a.username AND l.queue = :queue AND l.locked_until > :now
+)
+"""
+
+ACCOUNT_FIELDS = [x.name for x in fields(Account)]
+
+SELECT_USERNAMES = "SELECT username FROM accounts"
+SELECT_ACTIVE_USERNAMES = "SELECT username FROM accounts WHERE active = 1"
+SELECT_FAILED_USERNAMES = "SELECT username FROM accounts WHERE active = 0 AND error_msg IS NOT NULL"
+
+SELECT_ACCOUNT = f"SELECT {ACCOUNT_COLS} FROM accounts a WHERE a.username = :username"
+SELECT_ACCOUNTS = f"SELECT {ACCOUNT_COLS} FROM accounts a"
+SELECT_NOT_LOGGED_IN = f"{SELECT_ACCOUNTS} WHERE a.active = 0 AND a.error_msg IS NULL"
+
+_INSERT_ACCOUNT = "INSERT INTO accounts ({}) VALUES ({})".format(
+    ",".join(ACCOUNT_FIELDS), ",".join([f":{x}" for x in ACCOUNT_FIELDS])
+)
+INSERT_ACCOUNT = f"{_INSERT_ACCOUNT} ON CONFLICT(username) DO NOTHING"
+UPSERT_ACCOUNT = f"""
+{_INSERT_ACCOUNT}
+ON CONFLICT(username) DO UPDATE SET {",".join([f"{x}=excluded.{x}" for x in ACCOUNT_FIELDS])}
+"""
+
+DELETE_ACCOUNT = "DELETE FROM accounts WHERE username = :username"
+DELETE_INACTIVE = "DELETE FROM accounts WHERE active = 0"
+
+RESET_FOR_RELOGIN = """
+UPDATE accounts SET
+    active = 0,
+    locks = '{}',
+    last_used = NULL,
+    error_msg = NULL,
+    headers = '{}',
+    cookies = '{}',
+    user_agent = :user_agent
+WHERE username = :username
+"""
+
+SET_ACTIVE = "UPDATE accounts SET active = :active WHERE username = :username"
+SET_INACTIVE = "UPDATE accounts SET active = 0, error_msg = :error_msg WHERE username = :username"
+SET_LAST_USED = "UPDATE accounts SET last_used = :last_used WHERE username = :username"
+SET_LAST_USED_IF_NEWER = """
+UPDATE accounts SET last_used = :last_used
+WHERE username = :username AND (last_used IS NULL OR last_used < :last_used)
+"""
+
+INSERT_LOCK = """
+INSERT INTO account_locks (username, queue, locked_until) VALUES (:username, :queue, :locked_until)
+"""
+UPSERT_LOCK = """
+INSERT INTO account_locks (username, queue, locked_until, owner)
+VALUES (:username, :queue, :until, :owner)
+ON CONFLICT(username, queue) DO UPDATE SET
+    locked_until = excluded.locked_until, owner = excluded.owner
+"""
+RENEW_LEASE = """
+UPDATE account_locks SET locked_until = :until
+WHERE username = :username AND queue = :queue AND owner = :owner
+"""
+# with :owner only own lease removed (it can be expired and taken by other worker already)
+DELETE_LOCK = """
+DELETE FROM account_locks
+WHERE username = :username AND queue = :queue AND (:owner IS NULL OR owner = :owner)
+"""
+DELETE_ACCOUNT_LOCKS = "DELETE FROM account_locks WHERE username = :username"
+DELETE_ALL_LOCKS = "DELETE FROM account_locks"
+
+INSERT_STATS = "INSERT INTO account_stats VALUES (:username, :queue, :req_count)"
+INCREMENT_STATS = """
+INSERT INTO account_stats (username, queue, req_count) VALUES (:username, :queue, :req_count)
+ON CONFLICT(username, queue) DO UPDATE SET req_count = req_count + excluded.req_count
+"""
+DELETE_ACCOUNT_STATS = "DELETE FROM account_stats WHERE username = :username"
+
+# totals and per-queue locked count with earliest unlock (only queues locked by active accounts)
+QUEUE_STATS = """
+SELECT
+    (SELECT COUNT(*) FROM accounts) AS total,
+    (SELECT COUNT(*) FROM accounts WHERE active = 1) AS active,
+    q.queue, q.locked, q.next_unlock
+FROM (SELECT 1) LEFT JOIN (
+    SELECT l.queue,
+        SUM(CASE WHEN l.locked_until > :now THEN 1 ELSE 0 END) AS locked,
+        MIN(CASE WHEN l.locked_until > :now THEN l.locked_until END) AS next_unlock
+    FROM account_locks l JOIN accounts a ON a.username = l.username AND a.active = 1
+    {where}
+    GROUP BY l.queue
+) q ON 1
+"""
+ALL_QUEUES_STATS = QUEUE_STATS.format(where="")
+ONE_QUEUE_STATS = QUEUE_STATS.format(where="WHERE l.queue = :queue")
+
+# sqlite before 3.32 allows only 999 variables per statement
+IN_CHUNK_SIZE = 500
+
+
+def in_params(values: list[str], prefix="v") -> tuple[str, dict[str, str]]:
+    # named placeholders for `IN (...)` list; query text depends only on list size,
+    # so it stays in statement cache for repeated calls
+    return _placeholders(len(values), prefix), {f"{prefix}{i}": x for i, x in enumerate(values)}
+
+
+@lru_cache(maxsize=64)
+def _placeholders(size: int, prefix: str) -> str:
+    return ",".join([f":{prefix}{i}" for i in range(size)])
+
+
+@lru_cache(maxsize=64)
+def claim_queries(order_by: str, skip=0, demote=0) -> dict[str, str]:
+    # queries to select free account by strategy order and lock it (see AccountsPool._get_and_lock);
+    # `skip` / `demote` – sizes of :s / :d lists (in_params) of lowercase usernames which are not
+    # claimed / go after others (unhealthy accounts, see HealthTracker)
+    where = FREE_ACCOUNT
+    if skip:
+        where = f"{where} AND lower(a.username) NOT IN ({_placeholders(skip, 's')})"
+    if demote:
+        order_by = f"lower(a.username) IN ({_placeholders(demote, 'd')}), {order_by}"
+
+    free = f"SELECT a.username FROM accounts a WHERE {where} ORDER BY {order_by} LIMIT 1"
+    pick = f"""
+    SELECT a.username FROM accounts a WHERE {FREE_ACCOUNT} AND a.username = :pick LIMIT 1
+    """
+
+    return {
+        "free": free,
+        "pick": pick,
+        "claim_free": f"""
+        UPDATE accounts SET last_used = :last_used WHERE username = ({free})
+        RETURNING *, {QUEUE_COLS.format(t="accounts")}
+        """,
+        "claim_pick": f"""
+        UPDATE accounts SET last_used = :last_used WHERE username = ({pick})
+        RETURNING *, {QUEUE_COLS.format(t="accounts")}
+        """,
+        "candidates": f"""
+        SELECT a.username, a.last_used, COALESCE(
+            (SELECT s.req_count FROM account_stats s WHERE s.username = a.username AND s.queue = :queue),
+            0
+        ) AS req_count
+        FROM accounts a WHERE {FREE_ACCOUNT}
+        ORDER BY {order_by}
+        """,
+    }
@@ -1,5 +1,7 @@
+import asyncio
 import json
 import os
+import time
 from typing import Any
 
 import httpx
@@ -7,7 +9,7 @@ from httpx import AsyncClient, Response
 
 from .accounts_pool import Account, AccountsPool
 from .logger import logger
-from .utils import utc
+from .utils import rep_json, utc
 
 ReqParams = dict[str, str | int] | None
 TMP_TS = utc.now().isoformat().split(".")[0].replace("T", "_").replace(":", "-")[0:16]
@@ -17,7 +19,11 @@ class Ctx:
     def __init__(self, acc: Account, clt: AsyncClient):
         self.acc = acc
         self.clt = clt
+        self.owner = AccountsPool.lease_owner(acc)  # released / renewed only as this owner
         self.req_count = 0
+        self.next_req_at = 0.0  # used to pace requests when account close to rate limit
+        self.claim_after = 0.0  # failed lookup of account to switch to is cached until
+        self.heartbeat: asyncio.Task | None = None
 
 
 class HandledError(Exception):
@@ -56,8 +62,8 @@ def dump_rep(rep: Response):
     msg.append("\n")
 
     try:
-        msg.append(json.dumps(rep.json(), indent=2))
-    except json.JSONDecodeError:
+        msg.append(json.dumps(rep_json(rep), indent=2))
+    except ValueError:
         msg.append(rep.text)
 
     txt = "\n".join(msg)
@@ -86,6 +92,8 @@ class QueueClient:
 
         ctx, self.ctx, self.req_count = self.ctx, None, 0
         username = ctx.acc.username
+        if ctx.heartbeat is not None:
+            ctx.heartbeat.cancel()
         await ctx.clt.aclose()
 
         if inactive:
@@ -96,7 +104,7 @@ class QueueClient:
             await self.pool.lock_until(ctx.acc.username, self.queue, reset_at, ctx.req_count)
             return
 
-        await self.pool.unlock(ctx.acc.username, self.queue, ctx.req_count)
+        await self.pool.unlock(ctx.acc.username, self.queue, ctx.req_count, owner=ctx.owner)
 
     async def _get_ctx(self):
         if self.ctx:
@@ -106,10 +114,25 @@ class QueueClient:
         if acc is None:
             return None
 
-        clt = acc.make_client(proxy=self.proxy)
-        self.ctx = Ctx(acc, clt)
+        self.ctx = self._open_ctx(acc)
         return self.ctx
 
+    def _open_ctx(self, acc: Account):
+        ctx = Ctx(acc, acc.make_client(proxy=self.proxy))
+        ctx.heartbeat = asyncio.create_task(self._heartbeat(acc.username, ctx.owner))
+        return ctx
+
+    async def _heartbeat(self, username: str, owner: str | None):
+        # keep account lease while context is open (lease expires if process dies)
+        interval = max(self.pool.lease_ttl / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.pool.renew_lease(username, self.queue, owner):
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to renew lease of {username} on {self.queue}: {e}")
+
     async def _check_rep(self, rep: Response) -> None:
         """
         This function can raise Exception and request will be retried or aborted
@@ -120,13 +143,17 @@ class QueueClient:
             dump_rep(rep)
 
         try:
-            res = rep.json()
-        except json.JSONDecodeError:
+            res = rep_json(rep)
+        except ValueError:
             res: Any = {"_raw": rep.text}
 
         limit_remaining = int(rep.headers.get("x-rate-limit-remaining", -1))
         limit_reset = int(rep.headers.get("x-rate-limit-reset", -1))
-        # limit_max = int(rep.headers.get("x-rate-limit-limit", -1))
+        limit_max = int(rep.headers.get("x-rate-limit-limit", -1))
+
+        if self.ctx is not None:
+            username, queue = self.ctx.acc.username, self.queue
+            self.pool.update_rate_limit(username, queue, limit_remaining, limit_reset, limit_max)
 
         err_msg = "OK"
         if "errors" in res:
@@ -189,6 +216,7 @@ class QueueClient:
 
         if err_msg != "OK":
             logger.warning(f"API unknown error: {log_msg}")
+            setattr(rep, "__failed", True)  # counted in account health
             return  # ignore any other unknown errors
 
         try:
@@ -198,6 +226,37 @@ class QueueClient:
             await self._close_ctx(utc.ts() + 60 * 15)  # 15 minutes
             raise HandledError()
 
+    async def _check_budget(self, ctx: Ctx):
+        # switch account before it hits rate limit (and locked until reset),
+        # if no other account available – spread what left until reset
+        limits = self.pool.rate_limits
+        if not limits.is_low(ctx.acc.username, self.queue):
+            ctx.next_req_at = 0.0
+            return
+
+        budget = limits.get(ctx.acc.username, self.queue)  # set when low
+        now = time.time()
+        ctx.next_req_at = now + budget.interval()
+        if now < ctx.claim_after:
+            return
+
+        # claim is write transaction, so failed lookup is not repeated within same interval
+        acc = await self.pool.get_for_queue(self.queue)
+        if acc is None:
+            ctx.claim_after = ctx.next_req_at
+            return
+
+        logger.debug(f"Switching {ctx.acc.username} to {acc.username} on {self.queue} (rate limit)")
+        await self._close_ctx(budget.reset_at)
+        self.ctx = self._open_ctx(acc)
+
+    async def _report_failure(self, ctx: Ctx):
+        # when circuit of account opened, rest of retries go with another account
+        self.pool.report_outcome(ctx.acc.username, False)
+        if self.ctx is ctx and not self.pool.health.allows(ctx.acc.username):
+            logger.debug(f"Account {ctx.acc.username} is unhealthy, switching on {self.queue}")
+            await self._close_ctx()
+
     async def get(self, url: str, params: ReqParams = None):
         return await self.req("GET", url, params=params)
 
@@ -210,28 +269,37 @@ class QueueClient:
                 return None
 
             try:
+                if (delay := ctx.next_req_at - time.time()) > 0:
+                    await asyncio.sleep(delay)
+
                 rep = await ctx.clt.request(method, url, params=params)
                 setattr(rep, "__username", ctx.acc.username)
                 await self._check_rep(rep)
 
+                self.pool.report_outcome(ctx.acc.username, not getattr(rep, "__failed", False))
                 ctx.req_count += 1  # count only successful
                 unknown_retry, connection_retry = 0, 0
+                await self._check_budget(ctx)
                 return rep
             except AbortReqError:
                 # abort all queries
+                await self._report_failure(ctx)
                 return
             except HandledError:
                 # retry with new account
                 continue
             except (httpx.ReadTimeout, httpx.ProxyError):
-                # http transport failed, just retry with same account
+                # http transport failed, just retry with same account (unless it's unhealthy)
+                await self._report_failure(ctx)
                 continue
             except (httpx.ConnectError, httpx.ConnectTimeout) as e:
                 # if proxy missconfigured or ???
+                await self._report_failure(ctx)
                 connection_retry += 1
                 if connection_retry >= 3:
                     raise e
             except Exception as e:
+                await self._report_failure(ctx)
                 unknown_retry += 1
                 if unknown_retry >= 3:
                     msg = [
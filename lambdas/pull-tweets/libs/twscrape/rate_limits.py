@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+
+from .utils import utc
+
+
+@dataclass
+class RateBudget:
+    # requests budget of account for queue, as reported by x-rate-limit-* headers;
+    # works like token bucket which fully refilled at `reset_at`
+    limit: int
+    remaining: int
+    reset_at: int
+
+    def left(self, now: int | None = None) -> int:
+        now = now if now is not None else utc.ts()
+        return self.remaining if self.reset_at > now else self.limit
+
+    def interval(self, now: float | None = None) -> float:
+        # seconds between requests to spread what left evenly until reset
+        now = now if now is not None else utc.now().timestamp()
+        left = self.left(int(now))
+        if self.reset_at <= now or left <= 0:
+            return 0.0
+        return (self.reset_at - now) / left
+
+
+class RateLimits:
+    def __init__(self, reserve: int = 1):
+        # when account has `reserve` requests left, QueueClient switches to another account
+        # (or slows down if none available) instead of running it down to rate limit
+        self.reserve = reserve
+        self._items: dict[tuple[str, str], RateBudget] = {}
+
+    def update(self, username: str, queue: str, remaining: int, reset_at: int, limit: int = -1):
+        if remaining < 0 or reset_at < 0:
+            return
+
+        prev = self._items.get((username, queue))
+        limit = limit if limit > 0 else max(remaining, prev.limit if prev else 0)
+        self._items[(username, queue)] = RateBudget(limit, remaining, reset_at)
+
+    def get(self, username: str, queue: str) -> RateBudget | None:
+        return self._items.get((username, queue))
+
+    def is_low(self, username: str, queue: str) -> bool:
+        budget = self.get(username, queue)
+        return budget is not None and budget.left() <= self.reserve
+
+    def default_limit(self, queue: str) -> int | None:
+        # accounts without known budget expected to have same limit as others
+        limits = [v.limit for (_, q), v in self._items.items() if q == queue]
+        return max(limits) if limits else None
+
+    def capacity(self, queue: str, usernames: list[str]) -> dict[str, int | None]:
+        # predicted number of requests which can be made now for queue with given accounts
+        now, known, unknown, total = utc.ts(), 0, 0, 0
+        next_reset: int | None = None
+
+        for username in usernames:
+            budget = self.get(username, queue)
+            if budget is None:
+                unknown += 1
+                continue
+
+            known += 1
+            total += budget.left(now)
+            if budget.reset_at > now:
+                next_reset = min(next_reset or budget.reset_at, budget.reset_at)
+
+        default = self.default_limit(queue)
+        if default is not None:
+            total += unknown * default
+
+        return {
+            "accounts": len(usernames),
+            "known": known,
+            "requests": total if default is not None or unknown == 0 else None,
+            "next_reset": next_reset,
+        }
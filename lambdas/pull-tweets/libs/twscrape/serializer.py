@@ -0,0 +1,78 @@
+import types
+import typing
+from dataclasses import fields, is_dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterable
+
+# dataclass -> dict conversion without dataclasses.asdict deep copy: per class function
+# generated on first use, fields of scalar types copied as is, dates formatted with `fmt`
+# (kept as datetime when None), nested models / lists / dicts converted recursively
+
+DateFmt = Callable[[datetime], Any] | None
+
+_SCALARS = (int, float, str, bool, type(None))
+_serializers: dict[type, Callable] = {}
+
+
+def to_dict(obj: Any, fmt: DateFmt = None, only: Iterable[str] | None = None) -> dict:
+    # `only` – names of top-level fields to include (others not read, see LazyTweet)
+    return _serializer(type(obj))(obj, fmt, only)
+
+
+def _value(v: Any, fmt: DateFmt):
+    tp = type(v)
+    if tp in _SCALARS:
+        return v
+
+    ser = _serializers.get(tp)
+    if ser is not None:
+        return ser(v, fmt, None)
+
+    if tp is list or tp is tuple:
+        return [_value(x, fmt) for x in v]
+    if tp is dict:
+        return {k: _value(x, fmt) for k, x in v.items()}
+    if isinstance(v, datetime):
+        return fmt(v) if fmt else v
+    if is_dataclass(v):
+        return _serializer(tp)(v, fmt, None)
+    return v
+
+
+def _date(v: datetime | None, fmt: DateFmt):
+    return fmt(v) if fmt and v is not None else v
+
+
+def _field_expr(name: str, tp: Any) -> str:
+    is_union = typing.get_origin(tp) in (typing.Union, types.UnionType)
+    args = set(typing.get_args(tp)) if is_union else {tp}
+    if args <= set(_SCALARS):
+        return f"o.{name}"
+    if args <= {datetime, type(None)}:
+        return f"_date(o.{name}, fmt)"
+    if typing.get_origin(tp) is list and set(typing.get_args(tp)) <= set(_SCALARS):
+        return f"list(o.{name})"
+    return f"_value(o.{name}, fmt)"
+
+
+def _serializer(cls: type) -> Callable:
+    ser = _serializers.get(cls)
+    if ser is not None:
+        return ser
+
+    exprs = {x.name: _field_expr(x.name, x.type) for x in fields(cls)}
+    code = [
+        "def ser(o, fmt, only):",
+        "    if only is not None:",
+        "        return {k: getters[k](o, fmt) for k in only}",
+        "    return {",
+        *[f"        {k!r}: {v}," for k, v in exprs.items()],
+        "    }",
+    ]
+
+    ns: dict[str, Any] = {"_value": _value, "_date": _date}
+    ns["getters"] = {k: eval(f"lambda o, fmt: {v}", ns) for k, v in exprs.items()}
+    exec("\n".join(code), ns)
+
+    ser = _serializers[cls] = ns["ser"]
+    return ser
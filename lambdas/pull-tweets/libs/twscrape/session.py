@@ -0,0 +1,84 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from .accounts_pool import AccountsPool
+from .logger import logger
+from .queue_client import QueueClient
+
+
+class QueueSession:
+    # keeps QueueClients (leased account with warmed http client) per queue between single
+    # request API calls, so burst of lookups acquires account and opens connection once.
+    # Client returned to session after call and released after `idle` seconds without use;
+    # rate limited / banned account released by QueueClient itself, next call takes another one.
+    # Concurrent calls on same queue get own clients, so nothing is shared between requests.
+
+    def __init__(self, pool: AccountsPool, idle: float, debug=False, proxy: str | None = None):
+        self.pool = pool
+        self.idle = idle
+        self.debug = debug
+        self.proxy = proxy
+        self._free: dict[str, list[tuple[QueueClient, asyncio.TimerHandle]]] = {}
+        self._closing: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @asynccontextmanager
+    async def client(self, queue: str):
+        clt = self._take(queue) or QueueClient(self.pool, queue, self.debug, proxy=self.proxy)
+        try:
+            yield clt
+        except BaseException:
+            await clt._close_ctx()
+            raise
+
+        if clt.ctx is None:
+            return  # account released while request (or no account available)
+        self._put(queue, clt)
+
+    def _take(self, queue: str) -> QueueClient | None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # clients bound to previous loop can't be used or closed, leases expire by ttl
+            if self._free:
+                logger.debug(f"Session clients dropped on loop change: {len(self._free)} queues")
+            self._loop, self._free = loop, {}
+            return None
+
+        items = self._free.get(queue)
+        if not items:
+            return None
+
+        clt, timer = items.pop()  # most recently used
+        timer.cancel()
+        return clt
+
+    def _put(self, queue: str, clt: QueueClient):
+        timer = asyncio.get_running_loop().call_later(self.idle, self._expire, queue, clt)
+        self._free.setdefault(queue, []).append((clt, timer))
+
+    def _expire(self, queue: str, clt: QueueClient):
+        items = self._free.get(queue, [])
+        self._free[queue] = [x for x in items if x[0] is not clt]
+
+        task = asyncio.create_task(self._release(clt))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _release(self, clt: QueueClient):
+        try:
+            await clt._close_ctx()
+        except Exception as e:
+            logger.warning(f"Failed to release session client on {clt.queue}: {e}")
+
+    async def close(self):
+        free, self._free = self._free, {}
+        if self._loop is not asyncio.get_running_loop():
+            return
+
+        for items in free.values():
+            for clt, timer in items:
+                timer.cancel()
+                await self._release(clt)
+
+        if self._closing:
+            await asyncio.gather(*self._closing)
@@ -0,0 +1,563 @@
+import abc
+from dataclasses import replace
+
+from . import queries
+from .account import Account
+from .db import (
+    SQLITE_HAS_RETURNING,
+    checkpoint_db,
+    close_db,
+    execute,
+    executemany,
+    fetchall,
+    fetchone,
+    lock_retry,
+    transaction,
+)
+from .strategies import SelectionStrategy
+from .utils import utc
+from .write_buffer import WriteBuffer
+
+
+class AccountsStorage(abc.ABC):
+    # where AccountsPool keeps accounts, their locks and usage stats;
+    # claim must be atomic: same account never returned for queue until unlocked / expired
+
+    @abc.abstractmethod
+    async def close(self):
+        ...
+
+    @abc.abstractmethod
+    async def checkpoint(self):
+        ...
+
+    @abc.abstractmethod
+    async def get(self, username: str) -> Account | None:
+        ...
+
+    @abc.abstractmethod
+    async def get_all(self) -> list[Account]:
+        ...
+
+    @abc.abstractmethod
+    async def get_many(self, usernames: list[str]) -> list[Account]:
+        ...
+
+    @abc.abstractmethod
+    async def get_not_logged_in(self) -> list[Account]:
+        ...
+
+    @abc.abstractmethod
+    async def active_usernames(self) -> list[str]:
+        ...
+
+    @abc.abstractmethod
+    async def failed_usernames(self) -> list[str]:
+        ...
+
+    @abc.abstractmethod
+    async def add_new(self, accounts: list[Account]) -> tuple[list[Account], list[str]]:
+        # inserts accounts which not exist yet, returns (added, skipped usernames)
+        ...
+
+    @abc.abstractmethod
+    async def save(self, account: Account):
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, usernames: list[str]):
+        ...
+
+    @abc.abstractmethod
+    async def delete_inactive(self):
+        ...
+
+    @abc.abstractmethod
+    async def reset_for_relogin(self, user_agents: dict[str, str]):
+        ...
+
+    @abc.abstractmethod
+    async def set_active(self, username: str, active: bool):
+        ...
+
+    @abc.abstractmethod
+    async def mark_inactive(self, username: str, error_msg: str | None):
+        ...
+
+    @abc.abstractmethod
+    async def reset_locks(self):
+        ...
+
+    @abc.abstractmethod
+    async def update_usage(
+        self, username: str, queue: str, req_count: int, unlock_at: int | None, owner=None
+    ):
+        # lock account for queue until `unlock_at` (or unlock if None, only lease of `owner`
+        # when given), increment stats and last_used; raises ValueError if account not exists
+        ...
+
+    @abc.abstractmethod
+    async def renew(self, username: str, queue: str, owner: str, until: int) -> bool:
+        # extend lease of `owner`, False if it's lost (expired and taken by other worker)
+        ...
+
+    @abc.abstractmethod
+    async def apply(self, buffer: WriteBuffer):
+        ...
+
+    @abc.abstractmethod
+    async def claim(
+        self,
+        queue: str,
+        strategy: SelectionStrategy,
+        until: int,
+        owner: str,
+        username: str | None = None,
+        skip: list[str] | None = None,
+        demote: list[str] | None = None,
+    ) -> Account | None:
+        # `skip` – lowercase usernames not to claim, `demote` – claimed only if no other free
+        ...
+
+    @abc.abstractmethod
+    async def candidates(self, queue: str, strategy: SelectionStrategy) -> list:
+        # free accounts for queue as rows with username, last_used, req_count
+        ...
+
+    @abc.abstractmethod
+    async def queue_stats(self, queue: str | None = None) -> dict:
+        # {"total", "active", "queues": {queue: {"locked", "next_unlock"}}}
+        ...
+
+
+class SqliteStorage(AccountsStorage):
+    # accounts stored in sqlite file, every operation is db query, so several processes can
+    # share same file; methods with transaction are retried as a whole when db is locked
+    # (BEGIN IMMEDIATE / commit can fail after busy_timeout, transaction rolled back by then)
+
+    def __init__(self, db_file: str):
+        self._db_file = db_file
+
+    async def close(self):
+        await close_db(self._db_file)
+
+    async def checkpoint(self):
+        await checkpoint_db(self._db_file)
+
+    async def get(self, username: str):
+        rs = await fetchone(self._db_file, queries.SELECT_ACCOUNT, {"username": username})
+        return Account.from_rs(rs) if rs else None
+
+    async def get_all(self):
+        rs = await fetchall(self._db_file, queries.SELECT_ACCOUNTS)
+        return [Account.from_rs(x) for x in rs]
+
+    async def get_many(self, usernames: list[str]):
+        rs = []
+        for i in range(0, len(usernames), queries.IN_CHUNK_SIZE):
+            marks, params = queries.in_params(usernames[i : i + queries.IN_CHUNK_SIZE])
+            qs = f"{queries.SELECT_ACCOUNTS} WHERE a.username IN ({marks})"
+            rs.extend(await fetchall(self._db_file, qs, params))
+        return [Account.from_rs(x) for x in rs]
+
+    async def get_not_logged_in(self):
+        rs = await fetchall(self._db_file, queries.SELECT_NOT_LOGGED_IN)
+        return [Account.from_rs(x) for x in rs]
+
+    async def active_usernames(self):
+        rs = await fetchall(self._db_file, queries.SELECT_ACTIVE_USERNAMES)
+        return [x["username"] for x in rs]
+
+    async def failed_usernames(self):
+        rs = await fetchall(self._db_file, queries.SELECT_FAILED_USERNAMES)
+        return [x["username"] for x in rs]
+
+    @lock_retry()
+    async def add_new(self, accounts: list[Account]):
+        async with transaction(self._db_file) as db:
+            async with db.execute(queries.SELECT_USERNAMES) as cur:
+                exists = {x["username"].lower() for x in await cur.fetchall()}
+
+            skipped = [x.username for x in accounts if x.username.lower() in exists]
+            added = [x for x in accounts if x.username.lower() not in exists]
+            await db.executemany(queries.INSERT_ACCOUNT, [x.to_rs() for x in added])
+
+        return added, skipped
+
+    @lock_retry()
+    async def save(self, account: Account):
+        async with transaction(self._db_file) as db:
+            await self._write(db, [account])
+
+    async def _write(self, db, accounts: list[Account]):
+        data, locks, stats = [], [], []
+        for x in accounts:
+            data.append(x.to_rs())
+            locks.extend(
+                {"username": x.username, "queue": k, "locked_until": int(v.timestamp())}
+                for k, v in x.locks.items()
+            )
+            stats.extend(
+                {"username": x.username, "queue": k, "req_count": v} for k, v in x.stats.items()
+            )
+
+        await db.executemany(queries.UPSERT_ACCOUNT, data)
+        await db.executemany(queries.DELETE_ACCOUNT_LOCKS, data)
+        await db.executemany(queries.DELETE_ACCOUNT_STATS, data)
+        await db.executemany(queries.INSERT_LOCK, locks)
+        await db.executemany(queries.INSERT_STATS, stats)
+
+    @lock_retry()
+    async def replace_all(self, accounts: list[Account]):
+        # write full snapshot of accounts in one transaction (accounts not in list removed)
+        async with transaction(self._db_file) as db:
+            async with db.execute(queries.SELECT_USERNAMES) as cur:
+                keep = {x.username.lower() for x in accounts}
+                gone = [{"username": x["username"]} for x in await cur.fetchall()]
+                gone = [x for x in gone if x["username"].lower() not in keep]
+
+            await db.executemany(queries.DELETE_ACCOUNT, gone)
+            await self._write(db, accounts)
+
+    async def delete(self, usernames: list[str]):
+        params = [{"username": x} for x in usernames]
+        await executemany(self._db_file, queries.DELETE_ACCOUNT, params)
+
+    async def delete_inactive(self):
+        await execute(self._db_file, queries.DELETE_INACTIVE)
+
+    @lock_retry()
+    async def reset_for_relogin(self, user_agents: dict[str, str]):
+        params = [{"username": k, "user_agent": v} for k, v in user_agents.items()]
+        async with transaction(self._db_file) as db:
+            await db.executemany(queries.RESET_FOR_RELOGIN, params)
+            await db.executemany(queries.DELETE_ACCOUNT_LOCKS, params)
+
+    async def set_active(self, username: str, active: bool):
+        params = {"username": username, "active": active}
+        await execute(self._db_file, queries.SET_ACTIVE, params)
+
+    async def mark_inactive(self, username: str, error_msg: str | None):
+        params = {"username": username, "error_msg": error_msg}
+        await execute(self._db_file, queries.SET_INACTIVE, params)
+
+    async def reset_locks(self):
+        await execute(self._db_file, queries.DELETE_ALL_LOCKS)
+
+    @lock_retry()
+    async def update_usage(
+        self, username: str, queue: str, req_count: int, unlock_at: int | None, owner=None
+    ):
+        params = {
+            "username": username,
+            "queue": queue,
+            "req_count": req_count,
+            "until": unlock_at,
+            "owner": owner if unlock_at is None else None,
+            "last_used": utc.now().isoformat(),
+        }
+
+        # update lock, increment stats and last_used in one transaction
+        async with transaction(self._db_file) as db:
+            cur = await db.execute(queries.SET_LAST_USED, params)
+            if cur.rowcount == 0:
+                raise ValueError(f"Account {username} not found")
+
+            qs = queries.UPSERT_LOCK if unlock_at is not None else queries.DELETE_LOCK
+            await db.execute(qs, params)
+            await db.execute(queries.INCREMENT_STATS, params)
+
+    @lock_retry()
+    async def renew(self, username: str, queue: str, owner: str, until: int):
+        params = {"username": username, "queue": queue, "owner": owner, "until": until}
+        async with transaction(self._db_file) as db:
+            cur = await db.execute(queries.RENEW_LEASE, params)
+            return cur.rowcount > 0
+
+    @lock_retry()
+    async def apply(self, buffer: WriteBuffer):
+        locks, unlocks, stats, last_used = buffer.params()
+        async with transaction(self._db_file) as db:
+            await db.executemany(queries.SET_LAST_USED_IF_NEWER, last_used)
+            await db.executemany(queries.UPSERT_LOCK, locks)
+            await db.executemany(queries.DELETE_LOCK, unlocks)
+            await db.executemany(queries.INCREMENT_STATS, stats)
+
+    @lock_retry()
+    async def claim(
+        self,
+        queue: str,
+        strategy: SelectionStrategy,
+        until: int,
+        owner: str,
+        username: str | None = None,
+        skip: list[str] | None = None,
+        demote: list[str] | None = None,
+    ):
+        # account claimed in single write transaction, so parallel workers can't take same one
+        params = {
+            "queue": queue,
+            "now": utc.ts(),
+            "until": until,
+            "owner": owner,
+            "last_used": utc.now().isoformat(),
+            "pick": username,
+        }
+
+        skip, demote = skip or [], demote or []
+        params.update(queries.in_params(skip, "s")[1])
+        params.update(queries.in_params(demote, "d")[1])
+        qs = queries.claim_queries(strategy.order_by, len(skip), len(demote))
+        async with transaction(self._db_file, immediate=True) as db:
+            if SQLITE_HAS_RETURNING:
+                claim_qs = qs["claim_pick"] if username else qs["claim_free"]
+                async with db.execute(claim_qs, params) as cur:
+                    rs = await cur.fetchone()
+            else:
+                async with db.execute(qs["pick"] if username else qs["free"], params) as cur:
+                    rs = await cur.fetchone()
+
+                if rs:
+                    params["username"] = rs["username"]
+                    await db.execute(queries.SET_LAST_USED, params)
+                    async with db.execute(queries.SELECT_ACCOUNT, params) as cur:
+                        rs = await cur.fetchone()
+
+            if not rs:
+                return None
+
+            params["username"] = rs["username"]
+            await db.execute(queries.UPSERT_LOCK, params)
+
+        account = Account.from_rs(rs)
+        account.locks[queue] = utc.from_ts(until)
+        return account
+
+    async def candidates(self, queue: str, strategy: SelectionStrategy):
+        qs = queries.claim_queries(strategy.order_by)["candidates"]
+        return await fetchall(self._db_file, qs, {"queue": queue, "now": utc.ts()})
+
+    async def queue_stats(self, queue: str | None = None):
+        # aggregated in one query over indexed account_locks table; lambda's sqlite built
+        # without JSON1, so json_each can't be used here
+        qs = queries.ALL_QUEUES_STATS if queue is None else queries.ONE_QUEUE_STATS
+        rs = await fetchall(self._db_file, qs, {"now": utc.ts(), "queue": queue})
+
+        queues = {}
+        for x in rs:
+            if x["queue"] is not None:
+                queues[x["queue"]] = {"locked": x["locked"], "next_unlock": x["next_unlock"]}
+
+        return {"total": rs[0]["total"], "active": rs[0]["active"], "queues": queues}
+
+
+class MemoryStorage(AccountsStorage):
+    # accounts loaded from sqlite file once and kept decoded in memory; file is written only
+    # on `checkpoint` (full snapshot), so changes made after last checkpoint are lost on close;
+    # for single process use (eg. lambda), changes of other processes are not seen
+
+    def __init__(self, db_file: str):
+        self._disk = SqliteStorage(db_file)
+        self._items: dict[str, Account] | None = None  # lowercase username -> account
+        self._owners: dict[tuple[str, str], str] = {}  # (lowercase username, queue) -> owner
+
+    async def _load(self) -> dict[str, Account]:
+        if self._items is None:
+            self._items = {x.username.lower(): x for x in await self._disk.get_all()}
+        return self._items
+
+    async def close(self):
+        await self._disk.close()
+
+    async def checkpoint(self):
+        await self._disk.replace_all(list((await self._load()).values()))
+        await self._disk.checkpoint()
+
+    async def _find(self, username: str) -> Account | None:
+        return (await self._load()).get(username.lower())
+
+    async def get(self, username: str):
+        account = await self._find(username)
+        return _copy(account) if account else None
+
+    async def get_all(self):
+        return [_copy(x) for x in (await self._load()).values()]
+
+    async def get_many(self, usernames: list[str]):
+        items = await self._load()
+        keys = dict.fromkeys([x.lower() for x in usernames])
+        return [_copy(items[x]) for x in keys if x in items]
+
+    async def get_not_logged_in(self):
+        items = (await self._load()).values()
+        return [_copy(x) for x in items if not x.active and x.error_msg is None]
+
+    async def active_usernames(self):
+        return [x.username for x in (await self._load()).values() if x.active]
+
+    async def failed_usernames(self):
+        items = (await self._load()).values()
+        return [x.username for x in items if not x.active and x.error_msg is not None]
+
+    async def add_new(self, accounts: list[Account]):
+        items = await self._load()
+        skipped = [x.username for x in accounts if x.username.lower() in items]
+        added = [x for x in accounts if x.username.lower() not in items]
+        items.update({x.username.lower(): _copy(x) for x in added})
+        return added, skipped
+
+    async def save(self, account: Account):
+        (await self._load())[account.username.lower()] = _copy(account)
+
+    async def delete(self, usernames: list[str]):
+        items = await self._load()
+        for x in usernames:
+            items.pop(x.lower(), None)
+
+    async def delete_inactive(self):
+        items = await self._load()
+        for k in [k for k, v in items.items() if not v.active]:
+            del items[k]
+
+    async def reset_for_relogin(self, user_agents: dict[str, str]):
+        for username, user_agent in user_agents.items():
+            if x := await self._find(username):
+                x.active, x.locks, x.last_used, x.error_msg = False, {}, None, None
+                x.headers, x.cookies, x.user_agent = {}, {}, user_agent
+
+    async def set_active(self, username: str, active: bool):
+        if x := await self._find(username):
+            x.active = active
+
+    async def mark_inactive(self, username: str, error_msg: str | None):
+        if x := await self._find(username):
+            x.active, x.error_msg = False, error_msg
+
+    async def reset_locks(self):
+        self._owners.clear()
+        for x in (await self._load()).values():
+            x.locks = {}
+
+    async def update_usage(
+        self, username: str, queue: str, req_count: int, unlock_at: int | None, owner=None
+    ):
+        x = await self._find(username)
+        if x is None:
+            raise ValueError(f"Account {username} not found")
+
+        self._set_lock(x, queue, unlock_at, owner)
+        x.stats[queue] = x.stats.get(queue, 0) + req_count
+        x.last_used = utc.now()
+
+    async def renew(self, username: str, queue: str, owner: str, until: int):
+        x = await self._find(username)
+        if x is None or self._owners.get((username.lower(), queue)) != owner:
+            return False
+
+        x.locks[queue] = utc.from_ts(until)
+        return True
+
+    def _set_lock(self, x: Account, queue: str, unlock_at: int | None, owner=None):
+        key = (x.username.lower(), queue)
+        if unlock_at is None:
+            if owner is None or self._owners.get(key) == owner:
+                self._owners.pop(key, None)
+                x.locks.pop(queue, None)
+        else:
+            self._owners.pop(key, None)
+            x.locks[queue] = utc.from_ts(unlock_at)
+
+    async def apply(self, buffer: WriteBuffer):
+        items = await self._load()
+        for (username, queue), unlock_at in buffer.locks.items():
+            if x := items.get(username.lower()):
+                self._set_lock(x, queue, unlock_at, buffer.owners.get((username, queue)))
+        for (username, queue), req_count in buffer.stats.items():
+            if x := items.get(username.lower()):
+                x.stats[queue] = x.stats.get(queue, 0) + req_count
+        for username, last_used in buffer.last_used.items():
+            if x := items.get(username.lower()):
+                x.last_used = max(x.last_used or utc.from_iso(last_used), utc.from_iso(last_used))
+
+    def _free(self, items: dict[str, Account], queue: str) -> list[Account]:
+        now = utc.now()
+        return [x for x in items.values() if x.active and not (x.locks.get(queue, now) > now)]
+
+    async def claim(
+        self,
+        queue: str,
+        strategy: SelectionStrategy,
+        until: int,
+        owner: str,
+        username: str | None = None,
+        skip: list[str] | None = None,
+        demote: list[str] | None = None,
+    ):
+        # no await between search and lock, so claim is atomic within event loop
+        items = await self._load()
+        if username is not None:
+            x = items.get(username.lower())
+            items = {username.lower(): x} if x else {}
+
+        skip, demote = set(skip or []), set(demote or [])
+        free = [x for x in self._free(items, queue) if x.username.lower() not in skip]
+
+        if not free:
+            return None
+
+        x = min(free, key=lambda x: (x.username.lower() in demote, strategy.sort_key(x, queue)))
+        x.locks[queue] = utc.from_ts(until)
+        x.last_used = utc.now()
+        self._owners[(x.username.lower(), queue)] = owner
+        return _copy(x)
+
+    async def candidates(self, queue: str, strategy: SelectionStrategy):
+        rows = self._free(await self._load(), queue)
+        rows = sorted(rows, key=lambda x: strategy.sort_key(x, queue))
+        return [
+            {"username": x.username, "last_used": x.last_used, "req_count": x.stats.get(queue, 0)}
+            for x in rows
+        ]
+
+    async def queue_stats(self, queue: str | None = None):
+        items = (await self._load()).values()
+        now, queues = utc.ts(), {}
+        for x in items:
+            if not x.active:
+                continue
+
+            for q, at in x.locks.items():
+                if queue is not None and q != queue:
+                    continue
+
+                rep = queues.setdefault(q, {"locked": 0, "next_unlock": None})
+                at = int(at.timestamp())
+                if at > now:
+                    rep["locked"] += 1
+                    rep["next_unlock"] = min(rep["next_unlock"] or at, at)
+
+        active = sum(1 for x in items if x.active)
+        return {"total": len(items), "active": active, "queues": queues}
+
+
+def _copy(x: Account) -> Account:
+    # callers (login, QueueClient) change accounts they got, so stored ones are not shared
+    return replace(
+        x,
+        locks=dict(x.locks),
+        stats=dict(x.stats),
+        headers=dict(x.headers),
+        cookies=dict(x.cookies),
+    )
+
+
+def get_storage(storage: str | AccountsStorage, db_file: str) -> AccountsStorage:
+    if isinstance(storage, AccountsStorage):
+        return storage
+
+    if storage == "sqlite":
+        return SqliteStorage(db_file)
+    if storage == "memory":
+        return MemoryStorage(db_file)
+
+    raise ValueError(f"Unknown accounts storage: {storage}, available: ['sqlite', 'memory']")
@@ -0,0 +1,108 @@
+import random
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Mapping
+
+from .account import Account
+from .utils import utc
+
+if TYPE_CHECKING:
+    from .accounts_pool import AccountsPool
+
+# free account rows passed to SelectionStrategy.choose (username, last_used, req_count)
+CandidateRow = Mapping[str, Any]
+
+_NEVER = datetime.min  # sort key for accounts never used
+
+
+class SelectionStrategy:
+    # How AccountsPool picks free account for queue.
+    # If `choose` not overridden, account is selected and locked in single sql statement
+    # with `order_by` (accounts table alias is "a", queue name available as :queue param).
+    # Otherwise free accounts are fetched with `order_by` and `choose` returns usernames
+    # in preferred order, first one which is still free gets locked.
+    # `sort_key` is same order as `order_by` for storages without sql (see storage.py).
+
+    name = "username"
+    order_by = "a.username"
+    in_sql = True
+
+    def sort_key(self, account: Account, queue: str) -> Any:
+        return account.username.lower()
+
+    def choose(self, pool: "AccountsPool", queue: str, rows: list[CandidateRow]) -> list[str]:
+        return [x["username"] for x in rows]
+
+
+class ByUsername(SelectionStrategy):
+    # alphabetically first free account (old behavior)
+    pass
+
+
+class LeastRecentlyUsed(SelectionStrategy):
+    name = "lru"
+    order_by = "a.last_used IS NOT NULL, a.last_used, a.username"
+
+    def sort_key(self, account: Account, queue: str) -> Any:
+        last_used = account.last_used
+        return (last_used is not None, last_used or _NEVER, account.username.lower())
+
+
+class LeastLoaded(SelectionStrategy):
+    name = "least_loaded"
+    order_by = """
+    COALESCE(
+        (SELECT s.req_count FROM account_stats s WHERE s.username = a.username AND s.queue = :queue),
+        0
+    ), a.last_used IS NOT NULL, a.last_used
+    """
+
+    def sort_key(self, account: Account, queue: str) -> Any:
+        last_used = account.last_used
+        return (account.stats.get(queue, 0), last_used is not None, last_used or _NEVER)
+
+
+class WeightedRandom(SelectionStrategy):
+    # random account, less loaded (by queue stats) accounts have higher chance
+    name = "weighted_random"
+    order_by = LeastLoaded.order_by
+    sort_key = LeastLoaded.sort_key
+    in_sql = False
+
+    def choose(self, pool: "AccountsPool", queue: str, rows: list[CandidateRow]) -> list[str]:
+        # weighted shuffle, see: https://utopia.duth.gr/~pefraimi/research/data/2007EncOfAlg.pdf
+        keys = [random.random() ** (1 + x["req_count"]) for x in rows]
+        items = sorted(zip(keys, rows), key=lambda x: x[0], reverse=True)
+        return [x["username"] for _, x in items]
+
+
+class RateLimitAware(SelectionStrategy):
+    # account with most requests left before rate limit (by last x-rate-limit-* headers),
+    # accounts without known limit goes first
+    name = "rate_limit"
+    order_by = LeastRecentlyUsed.order_by
+    sort_key = LeastRecentlyUsed.sort_key
+    in_sql = False
+
+    def choose(self, pool: "AccountsPool", queue: str, rows: list[CandidateRow]) -> list[str]:
+        now, scores = utc.ts(), []
+        for x in rows:
+            budget = pool.get_rate_limit(x["username"], queue)
+            scores.append(budget.left(now) if budget else float("inf"))
+
+        items = sorted(zip(scores, rows), key=lambda x: x[0], reverse=True)  # stable for lru order
+        return [x["username"] for _, x in items]
+
+
+STRATEGIES: dict[str, type[SelectionStrategy]] = {
+    x.name: x for x in [ByUsername, LeastRecentlyUsed, LeastLoaded, WeightedRandom, RateLimitAware]
+}
+
+
+def get_strategy(strategy: str | SelectionStrategy) -> SelectionStrategy:
+    if isinstance(strategy, SelectionStrategy):
+        return strategy
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown account strategy: {strategy}, available: {list(STRATEGIES)}")
+
+    return STRATEGIES[strategy]()
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import weakref
+from functools import cache
+
+from httpx import AsyncBaseTransport, AsyncHTTPTransport, Request, Response
+
+from .logger import logger
+
+# connection pools shared by all account clients of event loop (httpcore pool bound to loop),
+# keyed by proxy. Account cookies & headers stay in own AsyncClient and sent with each request,
+# so rotating accounts or pages reuses open connections to x.com instead of new TCP+TLS setup.
+_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class SharedTransport(AsyncBaseTransport):
+    # transport given to account client, closing client keeps shared pool open
+    def __init__(self, transport: AsyncHTTPTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: Request) -> Response:
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        pass  # see close_transports()
+
+
+def use_http2() -> bool:
+    # HTTP/2 is opt-in (TWS_HTTP2=1), requires `h2` package (pip install httpx[http2])
+    return os.getenv("TWS_HTTP2", "0") in ("1", "true") and _has_h2()
+
+
+@cache
+def _has_h2() -> bool:
+    try:
+        import h2  # noqa: F401
+
+        return True
+    except ImportError:
+        logger.warning("TWS_HTTP2 is set, but h2 not installed; using HTTP/1.1")
+        return False
+
+
+def shared_transport(proxy: str | None = None) -> AsyncBaseTransport:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # no loop to bind pool to (client made outside of coroutine), use own transport
+        return AsyncHTTPTransport(retries=2, proxy=proxy)
+
+    items = _transports.setdefault(loop, {})
+    http2 = use_http2()
+    key = (proxy, http2)
+    if key not in items:
+        items[key] = AsyncHTTPTransport(retries=2, proxy=proxy, http2=http2)
+    return SharedTransport(items[key])
+
+
+async def close_transports():
+    # close connection pools of current loop, next client opens new ones
+    items = _transports.pop(asyncio.get_running_loop(), {})
+    for transport in items.values():
+        await transport.aclose()
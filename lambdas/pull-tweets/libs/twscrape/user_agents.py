@@ -0,0 +1,87 @@
+import hashlib
+import random
+
+from .logger import logger
+from .utils import get_env_bool
+
+# used when fake_useragent not available (offline, lambda cold start) or for stable assignment
+SAFARI_USER_AGENTS = [
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.6 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.0 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.1 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.2 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 18_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.1 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+]
+
+
+class UserAgentProvider:
+    # fake_useragent.UserAgent loads (and parses) its dataset on creation and filters it on
+    # every `.safari` call, so safari agents extracted once per process; with `offline` only
+    # bundled list used, with `deterministic` same account always gets same user agent
+    # (by username hash over bundled list)
+
+    def __init__(self, offline=False, deterministic=False):
+        self.offline = offline
+        self.deterministic = deterministic
+        self._agents: list[str] | None = None
+
+    def _load(self) -> list[str]:
+        if self._agents is not None:
+            return self._agents
+
+        self._agents = SAFARI_USER_AGENTS
+        if self.offline:
+            return self._agents
+
+        try:
+            from fake_useragent import UserAgent
+
+            agents = _safari_agents(UserAgent())
+            if agents:
+                self._agents = agents
+        except Exception as e:
+            logger.warning(f"Failed to load fake_useragent, using bundled list: {e}")
+
+        return self._agents
+
+    def get(self, username: str | None = None) -> str:
+        if self.deterministic and username:
+            idx = int(hashlib.md5(username.lower().encode()).hexdigest(), 16)
+            return SAFARI_USER_AGENTS[idx % len(SAFARI_USER_AGENTS)]
+
+        return random.choice(self._load())
+
+
+def _safari_agents(ua) -> list[str]:
+    data = getattr(ua, "data_browsers", None)
+
+    # fake_useragent>=1.2: list of dicts, older versions: dict of browser -> list of agents
+    if isinstance(data, list):
+        return [x["useragent"] for x in data if "safari" in str(x.get("browser", "")).lower()]
+    if isinstance(data, dict):
+        return list(data.get("safari", []))
+
+    return [ua.safari]
+
+
+_provider: UserAgentProvider | None = None
+
+
+def set_user_agent_provider(provider: UserAgentProvider):
+    global _provider
+    _provider = provider
+
+
+def get_user_agent(username: str | None = None) -> str:
+    global _provider
+    if _provider is None:
+        _provider = UserAgentProvider(
+            offline=get_env_bool("TWS_UA_OFFLINE"),
+            deterministic=get_env_bool("TWS_UA_DETERMINISTIC"),
+        )
+
+    return _provider.get(username)
@@ -2,10 +2,37 @@ import base64
 import json
 import os
 from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Any, AsyncGenerator, Callable, TypeVar
 
 T = TypeVar("T")
+_MISSING = object()
+
+try:
+    import orjson
+
+    _json_loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+def set_json_decoder(fn: Callable[[bytes], Any] | None):
+    # decoder for response bodies (gets bytes, raises ValueError on invalid json);
+    # orjson used by default when installed, None restores stdlib json
+    global _json_loads
+    _json_loads = fn or json.loads
+
+
+def rep_json(rep: Any) -> Any:
+    # decoded body of httpx.Response, cached on response so check / cursor / parse stages
+    # decode page once; result is shared between them, so must not be modified
+    res = getattr(rep, "__json", None)
+    if res is None:
+        res = _json_loads(rep.content)
+        setattr(rep, "__json", res)
+    return res
 
 
 class utc:
@@ -21,6 +48,10 @@ class utc:
     def ts() -> int:
         return int(utc.now().timestamp())
 
+    @staticmethod
+    def from_ts(ts: int | float) -> datetime:
+        return datetime.fromtimestamp(ts, timezone.utc)
+
 
 async def gather(gen: AsyncGenerator[T, None]) -> list[T]:
     items = []
@@ -42,10 +73,14 @@ def encode_params(obj: dict):
 
 
 def get_or(obj: dict, key: str, default_value: T = None) -> Any | T:
+    # one lookup per part (objects can be LegacyView, where each lookup is python call)
     for part in key.split("."):
-        if part not in obj:
+        try:
+            obj = obj.get(part, _MISSING)
+        except AttributeError:
+            return default_value  # not an object on path
+        if obj is _MISSING:
             return default_value
-        obj = obj[part]
     return obj
 
 
@@ -124,18 +159,133 @@ def get_typed_object(obj: dict, res: defaultdict[str, list]):
     return res
 
 
-def to_old_obj(obj: dict):
-    return {
-        **obj,
-        **obj["legacy"],
-        "id_str": str(obj["rest_id"]),
-        "id": int(obj["rest_id"]),
-        "legacy": None,
-    }
+@dataclass
+class RepIndex:
+    entries: Any = None  # first "entries" value (timeline items)
+    cursors: dict[str, Any] = field(default_factory=dict)  # cursorType: value (first of type)
+    typed: defaultdict[str, list] = field(default_factory=lambda: defaultdict(list))
+
+
+def walk_rep(obj: dict) -> RepIndex:
+    # single iterative pass over response collecting what get_by_path(obj, "entries"),
+    # find_obj(obj, cursorType == x) and get_typed_object(obj) give (same preorder).
+    # Difference: lists nested directly in lists ([[{...}]]) are walked here and by
+    # get_by_path, but find_obj / get_typed_object skip dicts inside them, so for such
+    # payloads more typed objects (or earlier cursor) can be found (x.com has none)
+    res = RepIndex()
+    typed, cursors = res.typed, res.cursors
+    dict_, list_, tuple_ = dict, list, tuple
+
+    stack = [iter((obj,))]
+    while stack:
+        for x in stack[-1]:
+            tx = type(x)
+            if tx is dict_:
+                if (t := x.get("__typename")) is not None:
+                    typed[t].append(x)
+                if (t := x.get("cursorType")) is not None and t not in cursors:
+                    cursors[t] = x.get("value")
+
+                if res.entries is None and "entries" in x:
+                    # marker at key position, so values before it walked first (as get_by_path)
+                    items = []
+                    for k, v in x.items():
+                        if k == "entries":
+                            items.append((v,))
+                        items.append(v)
+                    stack.append(iter(items))
+                else:
+                    stack.append(iter(x.values()))
+                break
+            elif tx is list_:
+                stack.append(iter(x))
+                break
+            elif tx is tuple_ and res.entries is None:
+                res.entries = x[0]  # json has no tuples, only "entries" marker
+        else:
+            stack.pop()
+
+    return res
+
+
+def rep_index(rep: Any) -> RepIndex:
+    # walk_rep of decoded body, cached on response like rep_json
+    res = getattr(rep, "__index", None)
+    if res is None:
+        res = walk_rep(rep_json(rep))
+        setattr(rep, "__index", res)
+    return res
+
+
+_OLD_KEYS = frozenset(["id_str", "id", "legacy"])
+
+
+class LegacyView(Mapping):
+    # read-only view of GQL object in old api format, same as
+    # {**obj, **obj["legacy"], "id_str": .., "id": .., "legacy": None} but without copying:
+    # keys resolved from "legacy" first, then from outer object. Tweet.parse / User.parse
+    # read keys from view directly; iteration (dict(view), json dump) goes through flat()
+    # copy, made once per view
+
+    __slots__ = ("_obj", "_legacy", "_flat")
+
+    def __init__(self, obj: dict):
+        self._obj = obj
+        self._legacy = obj["legacy"]
+        self._flat: dict | None = None
+
+    def flat(self) -> dict:
+        if self._flat is None:
+            obj = self._obj
+            rid = obj["rest_id"]
+            self._flat = {**obj, **self._legacy, "id_str": str(rid), "id": int(rid), "legacy": None}
+        return self._flat
+
+    def _old(self, key: str):
+        if key == "legacy":
+            return None
+        rid = self._obj["rest_id"]
+        return str(rid) if key == "id_str" else int(rid)
+
+    def __getitem__(self, key: str):
+        if key in _OLD_KEYS:
+            return self._old(key)
+        val = self._legacy.get(key, _MISSING)
+        return self._obj[key] if val is _MISSING else val
+
+    def get(self, key: str, default=None):
+        if key in _OLD_KEYS:
+            return self._old(key)
+        val = self._legacy.get(key, _MISSING)
+        return self._obj.get(key, default) if val is _MISSING else val
+
+    def __contains__(self, key):
+        return key in _OLD_KEYS or key in self._legacy or key in self._obj
+
+    def __iter__(self):
+        return iter(self.flat())
+
+    def __len__(self):
+        return len(self.flat())
+
+    def __bool__(self):
+        return True  # always has id / id_str, `if obj` must not go through __len__ copy
+
+    def __repr__(self):
+        return f"LegacyView({self.flat()!r})"
+
+
+def flat_obj(obj: Mapping) -> Mapping:
+    # plain dict for callers which need real dict (objects of to_old_rep or plain dicts)
+    return obj.flat() if type(obj) is LegacyView else obj
+
+
+def to_old_obj(obj: dict) -> LegacyView:
+    return LegacyView(obj)
 
 
-def to_old_rep(obj: dict) -> dict[str, dict]:
-    tmp = get_typed_object(obj, defaultdict(list))
+def to_old_rep(obj: dict | RepIndex) -> dict[str, dict[str, LegacyView]]:
+    tmp = (obj if isinstance(obj, RepIndex) else walk_rep(obj)).typed
 
     tw1 = [x for x in tmp.get("Tweet", []) if "legacy" in x]
     tw1 = {str(x["rest_id"]): to_old_obj(x) for x in tw1}
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from .utils import utc
+
+
+class WriteBuffer:
+    # pending lock / unlock / usage updates of AccountsPool in write-behind mode;
+    # lock state per (username, queue) keeps only last value (unlock_at or None to unlock),
+    # request counts are summed and last_used keeps latest time, so any number of requests
+    # between flushes ends up as one row per account / queue
+
+    def __init__(self):
+        self.locks: dict[tuple[str, str], int | None] = {}
+        self.owners: dict[tuple[str, str], str | None] = {}  # lease owner for unlock
+        self.stats: dict[tuple[str, str], int] = defaultdict(int)
+        self.last_used: dict[str, str] = {}
+
+    def __bool__(self):
+        return bool(self.locks or self.stats or self.last_used)
+
+    def set_lock(
+        self, username: str, queue: str, unlock_at: int | None, req_count=0, owner=None
+    ):
+        self.locks[(username, queue)] = unlock_at
+        self.owners[(username, queue)] = owner
+        if req_count:
+            self.stats[(username, queue)] += req_count
+        self.last_used[username] = utc.now().isoformat()
+
+    def claimed(self, username: str, queue: str):
+        # account locked again in db, so pending lock state of previous use is outdated
+        self.locks.pop((username, queue), None)
+        self.owners.pop((username, queue), None)
+
+    def drop_locks(self):
+        self.locks.clear()
+        self.owners.clear()
+
+    def has_release(self, queue: str):
+        return any(q == queue and v is None for (_, q), v in self.locks.items())
+
+    def take(self) -> "WriteBuffer":
+        # move pending updates to new buffer, so updates made while flushing are kept for next
+        taken = WriteBuffer()
+        taken.locks, self.locks = self.locks, {}
+        taken.owners, self.owners = self.owners, {}
+        taken.stats, self.stats = self.stats, defaultdict(int)
+        taken.last_used, self.last_used = self.last_used, {}
+        return taken
+
+    def merge_back(self, taken: "WriteBuffer"):
+        # flush failed, newer updates made during flush take precedence
+        for k, v in taken.locks.items():
+            if k not in self.locks:
+                self.locks[k], self.owners[k] = v, taken.owners.get(k)
+        for k, v in taken.stats.items():
+            self.stats[k] += v
+        for k, v in taken.last_used.items():
+            self.last_used[k] = max(v, self.last_used.get(k, v))
+
+    def params(self):
+        items, owners = self.locks.items(), self.owners
+        locks = [
+            {"username": u, "queue": q, "until": v, "owner": None}
+            for (u, q), v in items
+            if v is not None
+        ]
+        unlocks = [
+            {"username": u, "queue": q, "owner": owners.get((u, q))}
+            for (u, q), v in items
+            if v is None
+        ]
+        stats = [{"username": u, "queue": q, "req_count": v} for (u, q), v in self.stats.items()]
+        last_used = [{"username": k, "last_used": v} for k, v in self.last_used.items()]
+        return locks, unlocks, stats, last_used
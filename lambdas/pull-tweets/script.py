@@ -1,6 +1,8 @@
 from flask import Flask, jsonify, request
+from werkzeug.http import http_date
 import asyncio
-from libs.twscrape import API, gather
+from dataclasses import fields
+from libs.twscrape import API, AccountsPool, Tweet, close_transports, gather, to_dict
 import os
 import sqlite3
 import boto3
@@ -27,6 +29,13 @@ class EnvironmentManager:
         """Downloads the accounts.db file from S3 to the local file system."""
         if not self.is_production():
             return
+        # accounts.db is in WAL mode; -wal / -shm left in warm /tmp by invocation which died
+        # before pool.close() would be replayed by SQLite onto the freshly downloaded file
+        for suffix in ("-wal", "-shm"):
+            try:
+                os.remove(self.local_accounts_db_path + suffix)
+            except FileNotFoundError:
+                pass
         try:
             self.s3_client.download_file(
                 self.s3_bucket, self.s3_accounts_db_key, self.local_accounts_db_path
@@ -87,16 +96,23 @@ async def load_accounts(api:API):
         account_index += 1
 
 
-async def scrape_tweets(handle, limit):
+async def scrape_tweets(handle, limit, lazy=False):
     """Scrapes tweets for a given Twitter handle."""
     env_manager.download_accounts_db()
-    api = API(env_manager.local_accounts_db_path)
+    # accounts kept in memory for the request, accounts.db written only on checkpoint
+    pool = AccountsPool(env_manager.local_accounts_db_path, storage="memory")
+    api = API(pool, lazy_tweets=lazy)
 
-    await load_accounts(api)
-    env_manager.upload_accounts_db()
+    try:
+        await load_accounts(api)
+        await api.pool.checkpoint()  # write accounts to accounts.db (WAL flushed) before upload
+        env_manager.upload_accounts_db()
 
-    user = await api.user_by_login(handle)
-    tweets = await gather(api.user_tweets(user.id, limit=limit))
+        user = await api.user_by_login(handle)
+        tweets = await gather(api.user_tweets(user.id, limit=limit))
+    finally:
+        await api.pool.close()
+        await close_transports()  # connections shared by accounts, see twscrape/transport.py
 
     return tweets
 
@@ -105,9 +121,15 @@ async def scrape_tweets(handle, limit):
 def scrape(handle):
     """API endpoint to scrape tweets for a given handle."""
     limit = request.args.get("limit", default=20, type=int)
+    # optional projection, e.g. ?fields=id,date,rawContent (other tweet fields not parsed)
+    only = [x for x in request.args.get("fields", "").split(",") if x] or None
+    if only and (unknown := set(only) - {x.name for x in fields(Tweet)}):
+        return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+
     try:
-        result = asyncio.run(scrape_tweets(handle, limit))
-        return jsonify(result)
+        result = asyncio.run(scrape_tweets(handle, limit, lazy=only is not None))
+        # dates formatted same way as jsonify does for datetime
+        return jsonify([to_dict(x, http_date, only) for x in result])
     except Exception as e:
         print(f"Error scraping tweets for {handle}: {e}")
         return jsonify({"error": "Failed to scrape tweets"}), 500